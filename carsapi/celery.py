@@ -1,9 +1,54 @@
 # carsapi/celery.py
 import os
 from celery import Celery
+from celery.schedules import crontab
+
+from carsapi.profiles import current_process
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "carsapi.settings")
+# worker/beat: fără system checks la pornire (ar încărca URLconf-ul și view-urile DRF);
+# check-urile rulează la deploy cu `manage.py check`
+if current_process() in ("worker", "beat"):
+    os.environ.setdefault("CELERY_SKIP_CHECKS", "1")
 
 app = Celery("carsapi")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+# schedule-ul stă aici (nu în settings) ca web/cli să nu importe celery.schedules
+app.conf.beat_schedule = {
+    "policy-expiry-scan-00-01-every-10min": {
+        "task": "app.tasks.policy_expiry_scan",
+        # minutele 0,10,20,30,40,50 în H=0 (adică 00:xx)
+        "schedule": crontab(minute="0,10,20,30,40,50", hour=0),
+        "options": {"queue": "default"},
+    },
+    "claim-rollups-refresh-every-15min": {
+        "task": "app.tasks.refresh_claim_rollups",
+        "schedule": crontab(minute="*/15"),
+        "options": {"queue": "default"},
+    },
+    # incrementalul vede doar claim-uri noi; restul modificărilor le prinde rebuild-ul complet
+    "claim-rollups-full-rebuild-nightly": {
+        "task": "app.tasks.refresh_claim_rollups",
+        "schedule": crontab(minute=0, hour=3),
+        "kwargs": {"full": True},
+        "options": {"queue": "default"},
+    },
+    "archive-old-records-nightly": {
+        "task": "app.tasks.archive_old_records",
+        "schedule": crontab(minute=0, hour=2),
+        "options": {"queue": "default"},
+    },
+    # mașini șterse soft rămase nepurjate (broker căzut la DELETE, retry-uri epuizate)
+    "car-purge-sweep-hourly": {
+        "task": "app.tasks.purge_deleted_cars",
+        "schedule": crontab(minute=45),
+        "options": {"queue": "default"},
+    },
+    "idempotency-keys-purge-hourly": {
+        "task": "app.tasks.purge_idempotency_keys",
+        "schedule": crontab(minute=30),
+        "options": {"queue": "default"},
+    },
+}
@@ -0,0 +1,37 @@
+# carsapi/profiles.py
+import os
+import sys
+
+# tipuri de proces; fiecare încarcă doar ce folosește (vezi settings.INSTALLED_APPS)
+PROCESSES = ("web", "worker", "beat", "cli")
+
+# app-uri de care worker/beat nu au nevoie (admin, schema OpenAPI, filtre HTTP)
+WORKER_DEFERRED_APPS = (
+    "django.contrib.admin",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "drf_spectacular",
+    "django_filters",
+)
+
+
+def current_process(argv=None) -> str:
+    """
+    Profilul procesului curent: CARSAPI_PROCESS dacă e setat, altfel dedus din argv
+    (celery worker/beat, manage.py runserver vs. alte comenzi). Implicit `web`.
+    """
+    value = os.getenv("CARSAPI_PROCESS", "").lower()
+    if value in PROCESSES:
+        return value
+
+    argv = sys.argv if argv is None else argv
+    prog = os.path.basename(argv[0]) if argv else ""
+    if prog == "celery" or prog == "__main__.py" and "celery" in argv[0]:
+        if "beat" in argv:
+            return "beat"
+        if "worker" in argv:
+            return "worker"
+        return "cli"
+    if prog == "manage.py":
+        return "web" if "runserver" in argv else "cli"
+    return "web"
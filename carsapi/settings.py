@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os, environ
 from datetime import timedelta
-from celery.schedules import crontab
+from carsapi.profiles import current_process, WORKER_DEFERRED_APPS
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,8 +46,17 @@ INSTALLED_APPS = [
     "django_filters",
 ]
 
+# profil per proces (web/worker/beat/cli); worker/beat nu încarcă admin, schema, filtre
+CARSAPI_PROCESS = current_process()
+if CARSAPI_PROCESS in ("worker", "beat"):
+    INSTALLED_APPS = [a for a in INSTALLED_APPS if a not in WORKER_DEFERRED_APPS]
+
 MIDDLEWARE = [
     "carsapi_app.middleware.request_id.RequestIDMiddleware",
+    "carsapi_app.middleware.compression.CompressionMiddleware",
+    "carsapi_app.middleware.sql_latency.SqlLatencyMiddleware",
+    "carsapi_app.middleware.identity_map.IdentityMapMiddleware",
+    "carsapi_app.middleware.sharding.ShardPinMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -139,6 +148,10 @@ REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "carsapi_app.errors.custom_exception_handler",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    "DEFAULT_THROTTLE_CLASSES": [
+        "carsapi_app.throttling.LoadSheddingThrottle",
+        "carsapi_app.throttling.TokenBucketThrottle",
+    ],
 
 }
 
@@ -156,20 +169,80 @@ DATABASES = {
     }
 }
 
+# sharding pe owner: OWNER_SHARDS=shard_0,shard_1 (alias-uri DATABASES); Car/Policy/Claim/ExpiryLog
+# stau pe shard-ul owner-ului, `default` rămâne directorul global (owneri, idempotency, rollups).
+# Baza fiecărui shard: POSTGRES_DB_<ALIAS> sau <POSTGRES_DB>_<alias>; inițializare: manage.py setup_shards
+OWNER_SHARDS = [a for a in os.getenv("OWNER_SHARDS", "").split(",") if a]
+for _alias in OWNER_SHARDS:
+    DATABASES.setdefault(_alias, {
+        **DATABASES["default"],
+        "NAME": os.getenv(f"POSTGRES_DB_{_alias.upper()}", f"{DATABASES['default']['NAME']}_{_alias}"),
+    })
+DATABASE_ROUTERS = ["carsapi_app.sharding.OwnerShardRouter"] if OWNER_SHARDS else []
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TASK_DEFAULT_QUEUE = "default"
 
-_beat_mins = int(os.getenv("CELERY_BEAT_SCHEDULE_MINUTES", "10"))
-CELERY_BEAT_SCHEDULE = {
-    "policy-expiry-scan-00-01-every-10min": {
-        "task": "app.tasks.policy_expiry_scan",
-        # minutele 0,10,20,30,40,50 în H=0 (adică 00:xx)
-        "schedule": crontab(minute="0,10,20,30,40,50", hour=0),
-        "options": {"queue": "default"},
-    },
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 3600)))
+
+CLAIM_ANALYTICS_USE_ROLLUPS = os.getenv("CLAIM_ANALYTICS_USE_ROLLUPS", "true").lower() == "true"
+CLAIM_ANALYTICS_MAX_ROWS = int(os.getenv("CLAIM_ANALYTICS_MAX_ROWS", "5000"))
+
+# schema OpenAPI precompilată (manage.py build_openapi); runtime doar ca fallback în debug
+APP_VERSION = os.getenv("APP_VERSION", "")
+OPENAPI_SCHEMA_DIR = os.getenv("OPENAPI_SCHEMA_DIR", str(BASE_DIR / "build" / "openapi"))
+OPENAPI_SCHEMA_MAX_AGE = int(os.getenv("OPENAPI_SCHEMA_MAX_AGE", "300"))
+OPENAPI_RUNTIME_FALLBACK = os.getenv("OPENAPI_RUNTIME_FALLBACK", str(DEBUG)).lower() == "true"
+
+# compresie negociată (br/zstd dacă sunt instalate, altfel gzip) peste acest prag
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# token bucket per client + endpoint (`<basename>.<action>`); Redis partajat între workeri,
+# altfel stand-in in-memory per proces
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# clienții anonimi: IP-ul din header-ul proxy-ului (ex. X-Forwarded-For), nu REMOTE_ADDR
+# (în spatele proxy-ului REMOTE_ADDR e același pentru toți); gol = fără proxy
+RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+RATE_LIMIT_BUDGETS = {
+    "default": {"rate": "20/s", "burst": 40},
+    "car.insurance_valid": {"rate": "5/s", "burst": 10},
+    "car.list": {"rate": "5/s", "burst": 10},
+    "claim.analytics": {"rate": "30/m", "burst": 5},
 }
-from carsapi.logging_setup import setup_logging
-setup_logging()
+
+# load shedding: list/search/rapoarte -> 503 când EWMA latenței SQL trece de prag
+LOAD_SHED_SQL_LATENCY_MS = float(os.getenv("LOAD_SHED_SQL_LATENCY_MS", "250"))
+LOAD_SHED_WINDOW_SECONDS = 10
+LOAD_SHED_RETRY_AFTER = 5
+LOAD_SHED_LOW_PRIORITY_ACTIONS = ("list", "analytics")
+
+VIN_CACHE_SIZE = int(os.getenv("VIN_CACHE_SIZE", "4096"))
+
+# plafon dur pentru răspunsurile streaming (history, claims nepaginate)
+STREAMING_MAX_RESPONSE_BYTES = int(os.getenv("STREAMING_MAX_RESPONSE_BYTES", str(50 * 1024 * 1024)))
+
+# arhivare: polițe/claim-uri mai vechi de orizont -> tabele de arhivă (job nocturn)
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", str(5 * 365)))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+CAR_PURGE_BATCH_SIZE = int(os.getenv("CAR_PURGE_BATCH_SIZE", "1000"))
+# sweep-ul re-programează purge-ul mașinilor (și owner-ilor) șterse soft de mai mult de atât
+CAR_PURGE_SWEEP_GRACE_MINUTES = int(os.getenv("CAR_PURGE_SWEEP_GRACE_MINUTES", "30"))
+CAR_PURGE_SWEEP_LIMIT = int(os.getenv("CAR_PURGE_SWEEP_LIMIT", "500"))
+
+# check_query_plans: buget de cost (unități planner Postgres) per query de listare
+QUERY_PLAN_COST_BUDGET = float(os.getenv("QUERY_PLAN_COST_BUDGET", "5000"))
+# combinații acceptate conștient, "<basename>?<query>:<page|count>", separate prin virgulă
+QUERY_PLAN_ALLOWLIST = [p for p in os.getenv("QUERY_PLAN_ALLOWLIST", "").split(",") if p]
+# planurile acceptate azi, per vendor; comanda eșuează doar pe diferențe față de ele
+QUERY_PLAN_BASELINE = os.getenv("QUERY_PLAN_BASELINE", str(BASE_DIR / "carsapi_app" / "query_plans_baseline.json"))
+# host-uri (pe lângă localhost) pe care --seed are voie să scrie, ex. "db" în docker-compose
+QUERY_PLAN_SEED_HOSTS = [h for h in os.getenv("QUERY_PLAN_SEED_HOSTS", "").split(",") if h]
+
+_beat_mins = int(os.getenv("CELERY_BEAT_SCHEDULE_MINUTES", "10"))
+# CELERY_BEAT_SCHEDULE e definit în carsapi/celery.py (app.conf.beat_schedule)
@@ -0,0 +1,8 @@
+# carsapi/settings_test.py — setările pentru `manage.py test --settings=carsapi.settings_test`
+from carsapi.settings import *  # noqa: F401,F403
+from carsapi.settings import DATABASES
+
+# testele multi-DB pornesc modul sharded cu override_settings; au nevoie doar de alias-uri în DATABASES
+TEST_SHARD_ALIASES = ["shard_0", "shard_1", "shard_2"]
+for _alias in TEST_SHARD_ALIASES:
+    DATABASES.setdefault(_alias, {**DATABASES["default"], "NAME": f"{DATABASES['default']['NAME']}_{_alias}"})
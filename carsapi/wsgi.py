@@ -12,5 +12,6 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carsapi.settings')
+os.environ.setdefault('CARSAPI_PROCESS', 'web')
 
 application = get_wsgi_application()
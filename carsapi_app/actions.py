@@ -1,14 +1,22 @@
 # app/actions.py
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from datetime import date as _date
 import structlog
 
+from .models import InsurancePolicy, Claim, ArchivedInsurancePolicy, ArchivedClaim
 from .serializers import InsurancePolicySerializer, ClaimSerializer
+from .idempotency import idempotent_response
+from .conditional import collection_etag, is_not_modified, not_modified_response
+from .fieldsets import optimize_queryset
+from .streaming import serialize_rows, stream_json_array
+from .analytics import PERIODS, DIMENSIONS, claim_amount_analytics, percentiles_supported
+from . import sharding
 from .services import (
     create_policy_for_car, create_claim_for_car,
-    get_car_history, is_insured_on_date
+    iter_car_history, is_insured_on_date
 )
 
 logger = structlog.get_logger()
@@ -17,13 +25,22 @@ logger = structlog.get_logger()
 # ------------- POLICIES (GET+POST) -------------
 def get_or_create_policies_action(view, request, car):
     if request.method.lower() == "get":
-        qs = car.policies.all().order_by("-start_date")
+        etag = collection_etag(request, [car.policies.all()], ("policy",))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        qs = optimize_queryset(InsurancePolicy.objects.filter(car=car), InsurancePolicySerializer, request).order_by("-start_date")
         page = view.paginate_queryset(qs)
-        ser = InsurancePolicySerializer(page or qs, many=True)
+        ser = InsurancePolicySerializer(page or qs, many=True, context=view.get_serializer_context())
         logger.info("policies_listed", request_id=getattr(request, "id", None), car_id=car.id, count=len(ser.data))
-        return view.get_paginated_response(ser.data) if page is not None else Response(ser.data)
+        resp = view.get_paginated_response(ser.data) if page is not None else Response(ser.data)
+        resp["ETag"] = etag
+        return resp
 
-    # POST
+    # POST (Idempotency-Key opțional)
+    return idempotent_response(request, lambda: _create_policy(request, car))
+
+
+def _create_policy(request, car):
     obj = create_policy_for_car(
         car=car,
         provider=request.data.get("provider"),
@@ -45,13 +62,28 @@ def get_or_create_policies_action(view, request, car):
 # ------------- CLAIMS (GET+POST) -------------
 def get_or_create_claims_action(view, request, car):
     if request.method.lower() == "get":
-        qs = car.claims.all().order_by("-claim_date")
+        etag = collection_etag(request, [car.claims.all()], ("claim",))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        qs = optimize_queryset(Claim.objects.filter(car=car), ClaimSerializer, request).order_by("-claim_date")
         page = view.paginate_queryset(qs)
-        ser = ClaimSerializer(page or qs, many=True)
-        logger.info("claims_listed", request_id=getattr(request, "id", None), car_id=car.id, count=len(ser.data))
-        return view.get_paginated_response(ser.data) if page is not None else Response(ser.data)
+        context = view.get_serializer_context()
+        if page is None:
+            # fără paginare: stream rând cu rând, nu lista completă în memorie
+            logger.info("claims_streamed", request_id=getattr(request, "id", None), car_id=car.id)
+            resp = stream_json_array(serialize_rows(ClaimSerializer, qs, context))
+        else:
+            ser = ClaimSerializer(page, many=True, context=context)
+            logger.info("claims_listed", request_id=getattr(request, "id", None), car_id=car.id, count=len(ser.data))
+            resp = view.get_paginated_response(ser.data)
+        resp["ETag"] = etag
+        return resp
+
+    # POST (Idempotency-Key opțional)
+    return idempotent_response(request, lambda: _create_claim(request, car))
 
-    # POST
+
+def _create_claim(request, car):
     obj = create_claim_for_car(
         car=car,
         claim_date=request.data.get("claim_date"),
@@ -72,10 +104,19 @@ def get_or_create_claims_action(view, request, car):
 
 
 # ------------- HISTORY (GET) -------------
-def history_action(car):
-    data = get_car_history(car)
-    logger.info("history_returned", car_id=car.id, items=len(data))
-    return Response(data)
+def history_action(car, request):
+    # ?include_archived=true -> read-through și din tabelele de arhivă
+    include_archived = request.query_params.get("include_archived", "").lower() in ("1", "true")
+    sources = [InsurancePolicy.objects.filter(car=car), Claim.objects.filter(car=car)]
+    if include_archived:
+        sources += [ArchivedInsurancePolicy.objects.filter(car_id=car.pk), ArchivedClaim.objects.filter(car_id=car.pk)]
+    etag = collection_etag(request, sources, ("policy", "claim"))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    logger.info("history_streamed", request_id=getattr(request, "id", None), car_id=car.id, include_archived=include_archived)
+    resp = stream_json_array(iter_car_history(car, include_archived=include_archived))
+    resp["ETag"] = etag
+    return resp
 
 
 # ------------- INSURANCE VALID (GET) -------------
@@ -107,3 +148,72 @@ def insurance_valid_action(car, request):
     valid = is_insured_on_date(car, target)
     logger.info("insurance_valid_checked", request_id=getattr(request, "id", None), car_id=car.id, date=str(target), valid=bool(valid))
     return Response({"carId": car.id, "date": str(target), "valid": valid})
+
+
+# ------------- CLAIM ANALYTICS (GET) -------------
+def _bad_request(request, event, detail, **kw):
+    logger.warning(event, request_id=getattr(request, "id", None), **kw)
+    return Response({"detail": detail}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def claim_analytics_action(request):
+    if sharding.enabled():
+        # agregările rulează pe un singur DB; claim-urile sunt împărțite pe shard-uri
+        logger.warning("claim_analytics_unavailable_sharded", request_id=getattr(request, "id", None))
+        return Response({"detail": "Claim analytics is not available in owner-sharded mode."},
+                        status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    params = request.query_params
+
+    period = params.get("period", "month")
+    if period not in PERIODS:
+        return _bad_request(request, "claim_analytics_bad_period",
+                            f"Query param 'period' must be one of {', '.join(PERIODS)}.", period=period)
+
+    group_by = [g for g in params.get("group_by", "").split(",") if g]
+    unknown = [g for g in group_by if g not in DIMENSIONS]
+    if unknown:
+        return _bad_request(request, "claim_analytics_bad_group_by",
+                            f"Query param 'group_by' accepts: {', '.join(DIMENSIONS)}.", group_by=unknown)
+    group_by = list(dict.fromkeys(group_by))
+
+    filters = {}
+    for name in ("date_from", "date_to"):
+        if params.get(name):
+            try:
+                filters[name] = _date.fromisoformat(params[name])
+            except ValueError:
+                return _bad_request(request, "claim_analytics_bad_date",
+                                    f"Invalid '{name}' format. Use YYYY-MM-DD.", field=name)
+    for name in ("make", "model", "provider"):
+        if params.get(name):
+            filters[name] = params[name]
+    if params.get("owner"):
+        if not params["owner"].isdigit():
+            return _bad_request(request, "claim_analytics_bad_owner", "Query param 'owner' must be an id.")
+        filters["owner"] = int(params["owner"])
+
+    percentiles = []
+    if params.get("percentiles"):
+        try:
+            percentiles = sorted({float(p) for p in params["percentiles"].split(",") if p})
+        except ValueError:
+            percentiles = [-1]
+        if any(not (0 < p < 100) for p in percentiles):
+            return _bad_request(request, "claim_analytics_bad_percentiles",
+                                "Query param 'percentiles' must be numbers in (0, 100), e.g. 50,90,99.")
+        if not percentiles_supported():
+            return _bad_request(request, "claim_analytics_percentiles_unsupported",
+                                "Percentiles require a PostgreSQL database.")
+
+    data = claim_amount_analytics(
+        period=period,
+        group_by=group_by,
+        filters=filters,
+        percentiles=percentiles,
+        use_rollups=settings.CLAIM_ANALYTICS_USE_ROLLUPS and params.get("source") != "raw",
+        limit=settings.CLAIM_ANALYTICS_MAX_ROWS,
+    )
+    logger.info("claim_analytics_returned", request_id=getattr(request, "id", None),
+                period=period, group_by=group_by, source=data["source"], rows=len(data["results"]))
+    return Response(data)
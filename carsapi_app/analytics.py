@@ -0,0 +1,243 @@
+# app/analytics.py
+from __future__ import annotations
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from django.db import connection, transaction
+from django.db.models import (
+    Aggregate, Avg, Count, DateField, F, FloatField, Max, Min, OuterRef, Subquery, Sum,
+)
+from django.db.models.functions import Trunc
+from django.utils import timezone
+import structlog
+
+from .models import Claim, ClaimDailyRollup, InsurancePolicy
+
+logger = structlog.get_logger()
+
+PERIODS = ("day", "month", "year")
+DIMENSIONS = ("make", "model", "owner", "provider")
+# overlap pentru refresh incremental: prinde claim-urile comise după watermark
+ROLLUP_WATERMARK_OVERLAP = timedelta(minutes=5)
+ROLLUP_DAYS_PER_BATCH = 200
+
+# nume dimensiune -> cheie în răspuns (camelCase, ca în restul API-ului)
+_OUTPUT_KEYS = {"period_start": "periodStart", "make": "make", "model": "model",
+                "owner_id": "ownerId", "provider": "provider"}
+_GROUP_COLUMNS = {"make": "make", "model": "model", "owner": "owner_id", "provider": "provider"}
+_CENT = Decimal("0.01")
+
+
+class PercentileCont(Aggregate):
+    """percentile_cont(p) WITHIN GROUP (ORDER BY expr) — doar PostgreSQL."""
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile: float, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+def percentiles_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def _active_provider():
+    """Providerul poliței active la data claim-ului (prima găsită)."""
+    return Subquery(
+        InsurancePolicy.objects.filter(
+            car_id=OuterRef("car_id"),
+            start_date__lte=OuterRef("claim_date"),
+            end_date__gte=OuterRef("claim_date"),
+        ).order_by("-start_date").values("provider")[:1]
+    )
+
+
+def _money(value) -> Optional[str]:
+    if value is None:
+        return None
+    return str(Decimal(value).quantize(_CENT))
+
+
+def _counted_claims():
+    """
+    Claim-urile care intră în analytics (și în rollup-uri): doar cele live.
+    Claim-urile arhivate (ArchivedClaim) și cele ale mașinilor șterse soft nu se numără.
+    """
+    return Claim.objects.filter(car__deleted_at__isnull=True)
+
+
+# ---------- RAW (agregare direct pe claims) ----------
+def _raw_rows(period, group_by, filters, percentiles):
+    qs = _counted_claims()
+    if filters.get("date_from"):
+        qs = qs.filter(claim_date__gte=filters["date_from"])
+    if filters.get("date_to"):
+        qs = qs.filter(claim_date__lte=filters["date_to"])
+    if filters.get("make"):
+        qs = qs.filter(car__make=filters["make"])
+    if filters.get("model"):
+        qs = qs.filter(car__model=filters["model"])
+    if filters.get("owner"):
+        qs = qs.filter(car__owner_id=filters["owner"])
+
+    dims = {"period_start": Trunc("claim_date", period, output_field=DateField())}
+    if "make" in group_by:
+        dims["make"] = F("car__make")
+    if "model" in group_by:
+        dims["model"] = F("car__model")
+    if "owner" in group_by:
+        dims["owner_id"] = F("car__owner_id")
+    if "provider" in group_by or filters.get("provider"):
+        dims["provider"] = _active_provider()
+
+    qs = qs.annotate(**dims)
+    if filters.get("provider"):
+        qs = qs.filter(provider=filters["provider"])
+    keys = ["period_start"] + [_GROUP_COLUMNS[d] for d in group_by]
+
+    metrics = {
+        "count": Count("id"),
+        "sum": Sum("amount"),
+        "avg": Avg("amount"),
+        "min": Min("amount"),
+        "max": Max("amount"),
+    }
+    for p in percentiles:
+        metrics[f"p{p:g}"] = PercentileCont("amount", round(p / 100, 6))
+
+    return keys, qs.values(*keys).annotate(**metrics).order_by(*keys)
+
+
+# ---------- ROLLUP (agregare pe tabela zilnică) ----------
+def _rollup_rows(period, group_by, filters):
+    qs = ClaimDailyRollup.objects.all()
+    if filters.get("date_from"):
+        qs = qs.filter(day__gte=filters["date_from"])
+    if filters.get("date_to"):
+        qs = qs.filter(day__lte=filters["date_to"])
+    for name in ("make", "model", "provider"):
+        if filters.get(name):
+            qs = qs.filter(**{name: filters[name]})
+    if filters.get("owner"):
+        qs = qs.filter(owner_id=filters["owner"])
+
+    keys = ["period_start"] + [_GROUP_COLUMNS[d] for d in group_by]
+    qs = (
+        qs.annotate(period_start=Trunc("day", period, output_field=DateField()))
+        .values(*keys)
+        .annotate(
+            count=Sum("claim_count"),
+            sum=Sum("amount_sum"),
+            min=Min("amount_min"),
+            max=Max("amount_max"),
+        )
+        .order_by(*keys)
+    )
+    return keys, qs
+
+
+def claim_amount_analytics(
+    *,
+    period: str,
+    group_by: Sequence[str],
+    filters: Dict[str, Any],
+    percentiles: Sequence[float] = (),
+    use_rollups: bool = True,
+    limit: int = 5000,
+) -> Dict[str, Any]:
+    """
+    Agregări count/sum/avg/min/max (+ percentile) pe `amount`, grupate pe perioadă
+    și dimensiuni. Totul se calculează în SQL.
+    Percentilele nu se pot compune din rollup-uri, deci forțează sursa `raw`;
+    la fel și tabela de rollup goală (înainte de primul refresh).
+    """
+    source = "rollup" if use_rollups and not percentiles else "raw"
+    if source == "rollup" and not ClaimDailyRollup.objects.exists():
+        source = "raw"
+    if source == "rollup":
+        keys, qs = _rollup_rows(period, group_by, filters)
+    else:
+        keys, qs = _raw_rows(period, group_by, filters, percentiles)
+
+    rows = list(qs[: limit + 1])
+    truncated = len(rows) > limit
+    results: List[Dict[str, Any]] = []
+    for row in rows[:limit]:
+        item = {_OUTPUT_KEYS[k]: row[k] for k in keys}
+        item["periodStart"] = str(row["period_start"])
+        count = row["count"] or 0
+        total = row["sum"]
+        item["count"] = count
+        item["sum"] = _money(total)
+        item["avg"] = _money(row["avg"] if "avg" in row else (total / count if count else None))
+        item["min"] = _money(row["min"])
+        item["max"] = _money(row["max"])
+        for p in percentiles:
+            name = f"p{p:g}"
+            item[name] = _money(row[name])
+        results.append(item)
+
+    return {
+        "period": period,
+        "groupBy": list(group_by),
+        "source": source,
+        "truncated": truncated,
+        "results": results,
+    }
+
+
+# ---------- ROLLUP REFRESH (job-ul de background) ----------
+def _dirty_days(full: bool) -> Iterable[date]:
+    claims = _counted_claims().order_by()
+    if not full:
+        watermark = ClaimDailyRollup.objects.aggregate(m=Max("refreshed_at"))["m"]
+        if watermark is not None:
+            claims = claims.filter(created_at__gte=watermark - ROLLUP_WATERMARK_OVERLAP)
+    return claims.values_list("claim_date", flat=True).distinct().order_by("claim_date")
+
+
+def _rebuild_days(days: List[date], refreshed_at) -> int:
+    rows = (
+        _counted_claims().filter(claim_date__in=days)
+        .annotate(make=F("car__make"), model=F("car__model"),
+                  owner_id=F("car__owner_id"), provider=_active_provider())
+        .values("claim_date", "make", "model", "owner_id", "provider")
+        .annotate(claim_count=Count("id"), amount_sum=Sum("amount"),
+                  amount_min=Min("amount"), amount_max=Max("amount"))
+        .order_by()
+    )
+    objs = [
+        ClaimDailyRollup(
+            day=r["claim_date"], make=r["make"], model=r["model"], owner_id=r["owner_id"],
+            provider=r["provider"], claim_count=r["claim_count"], amount_sum=r["amount_sum"],
+            amount_min=r["amount_min"], amount_max=r["amount_max"], refreshed_at=refreshed_at,
+        )
+        for r in rows.iterator()
+    ]
+    with transaction.atomic():
+        ClaimDailyRollup.objects.filter(day__in=days).delete()
+        ClaimDailyRollup.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
+
+
+def refresh_claim_daily_rollups(full: bool = False) -> int:
+    """
+    Recalculează rollup-urile zilnice pentru zilele atinse de claim-uri noi
+    (created_at >= ultimul refresh - overlap). `full=True` reconstruiește tot;
+    prinde editările/ștergerile de claim-uri, polițele retroactive, mașinile șterse,
+    arhivarea și schimbările de owner/make/model (rulează nocturn, după arhivare).
+    Returnează numărul de rânduri rollup scrise.
+    """
+    refreshed_at = timezone.now()
+    days = list(_dirty_days(full))
+
+    written = 0
+    for i in range(0, len(days), ROLLUP_DAYS_PER_BATCH):
+        written += _rebuild_days(days[i:i + ROLLUP_DAYS_PER_BATCH], refreshed_at)
+    if full:
+        # zile fără claim-uri rămase -> rânduri vechi, nereconstruite
+        ClaimDailyRollup.objects.filter(refreshed_at__lt=refreshed_at).delete()
+    logger.info("claim_rollups_refreshed", full=full, days=len(days), rows=written)
+    return written
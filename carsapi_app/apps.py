@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CarsapiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'carsapi_app'
+
+    def ready(self):
+        # logging-ul se configurează după setup, nu la importul settings
+        from carsapi.logging_setup import setup_logging
+        setup_logging()
+
+        from . import conditional, sharding, vin
+        conditional.connect_signals()
+        vin.connect_signals()
+        sharding.connect_signals()
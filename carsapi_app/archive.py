@@ -0,0 +1,150 @@
+# app/archive.py
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+import structlog
+
+from .models import (
+    Owner, Car, InsurancePolicy, Claim, PolicyExpiryLog,
+    ArchivedInsurancePolicy, ArchivedClaim,
+)
+from . import sharding
+
+logger = structlog.get_logger()
+
+
+def archive_cutoff(today: Optional[date] = None) -> date:
+    """Tot ce s-a încheiat înainte de această dată se mută în arhivă."""
+    return (today or timezone.localdate()) - timedelta(days=settings.ARCHIVE_HORIZON_DAYS)
+
+
+# ---------- ARHIVARE ----------
+def _archive_policies(batch):
+    logged = dict(
+        PolicyExpiryLog.objects.filter(policy_id__in=[p.pk for p in batch])
+        .values_list("policy_id", "logged_expiry_at")
+    )
+    return [
+        ArchivedInsurancePolicy(
+            original_id=p.pk, car_id=p.car_id, provider=p.provider,
+            start_date=p.start_date, end_date=p.end_date, expiry_logged_at=logged.get(p.pk),
+        )
+        for p in batch
+    ]
+
+
+def _archive_claims(batch):
+    return [
+        ArchivedClaim(
+            original_id=c.pk, car_id=c.car_id, claim_date=c.claim_date,
+            description=c.description, amount=c.amount, created_at=c.created_at,
+        )
+        for c in batch
+    ]
+
+
+def _move_in_batches(qs, to_archive, archive_model, batch_size: int, max_batches: Optional[int]) -> int:
+    """Copiere în arhivă + ștergere din tabela hot, câte un batch per tranzacție."""
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        with sharding.atomic():
+            batch = list(qs.order_by("pk").select_for_update()[:batch_size])
+            if not batch:
+                break
+            archive_model.objects.bulk_create(to_archive(batch), ignore_conflicts=True)
+            qs.model.objects.filter(pk__in=[o.pk for o in batch]).delete()
+        moved += len(batch)
+        batches += 1
+    return moved
+
+
+def archive_old_records(today: Optional[date] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """
+    Mută polițele (end_date) și claim-urile (claim_date) mai vechi de
+    ARCHIVE_HORIZON_DAYS în tabelele de arhivă. Idempotent (original_id unic).
+    """
+    cutoff = archive_cutoff(today)
+    batch_size = settings.ARCHIVE_BATCH_SIZE
+    result = {
+        "claims": _move_in_batches(
+            Claim.objects.filter(claim_date__lt=cutoff), _archive_claims, ArchivedClaim, batch_size, max_batches,
+        ),
+        "policies": _move_in_batches(
+            InsurancePolicy.objects.filter(end_date__lt=cutoff), _archive_policies, ArchivedInsurancePolicy,
+            batch_size, max_batches,
+        ),
+    }
+    logger.info("archive_done", cutoff=str(cutoff), **result)
+    return result
+
+
+# ---------- ȘTERGERE MAȘINĂ (asincron, în batch-uri) ----------
+def _delete_in_batches(qs, batch_size: int) -> int:
+    deleted = 0
+    while True:
+        ids = list(qs.order_by().values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with sharding.atomic():
+            qs.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def purge_car_data(car_id: int) -> Dict[str, int]:
+    """
+    Șterge tot ce ține de o mașină marcată deleted_at, câte un batch per tranzacție,
+    apoi mașina însăși. Reluabil: dacă jobul pică la jumătate, rularea următoare continuă.
+    """
+    batch_size = settings.CAR_PURGE_BATCH_SIZE
+    result = {
+        "claims": _delete_in_batches(Claim.objects.filter(car_id=car_id), batch_size),
+        # PolicyExpiryLog se șterge în cascadă cu fiecare batch de polițe
+        "policies": _delete_in_batches(InsurancePolicy.objects.filter(car_id=car_id), batch_size),
+        "archived_claims": _delete_in_batches(ArchivedClaim.objects.filter(car_id=car_id), batch_size),
+        "archived_policies": _delete_in_batches(ArchivedInsurancePolicy.objects.filter(car_id=car_id), batch_size),
+    }
+    result["car"], _ = Car.objects.filter(pk=car_id, deleted_at__isnull=False).delete()
+    logger.info("car_purged", car_id=car_id, **result)
+    return result
+
+
+def pending_car_purges(limit: int) -> List[int]:
+    """
+    Mașinile șterse soft al căror purge n-a terminat (enqueue pierdut, retry-uri epuizate).
+    Perioada de grație lasă în pace purge-urile încă în lucru.
+    """
+    older_than = timezone.now() - timedelta(minutes=settings.CAR_PURGE_SWEEP_GRACE_MINUTES)
+    return list(
+        Car.objects.filter(deleted_at__lt=older_than).order_by("deleted_at")
+        .values_list("pk", flat=True)[:limit]
+    )
+
+
+def purge_owner_data(owner_id: int) -> Dict[str, int]:
+    """
+    Owner marcat deleted_at: marchează și purge-uiește mașinile lui una câte una
+    (purge_car_data, pe shard-ul curent), apoi șterge owner-ul. Reluabil ca purge_car_data.
+    """
+    if not Owner.objects.filter(pk=owner_id, deleted_at__isnull=False).exists():
+        return {"cars": 0, "owner": 0}
+    Car.objects.filter(owner_id=owner_id, deleted_at__isnull=True).update(deleted_at=timezone.now())
+    car_ids = list(Car.objects.filter(owner_id=owner_id).values_list("pk", flat=True))
+    for car_id in car_ids:
+        purge_car_data(car_id)
+    # replica de pe shard se șterge din semnalul post_delete (sharding._on_owner_deleted)
+    owner, _ = Owner.objects.filter(pk=owner_id, deleted_at__isnull=False).delete()
+    result = {"cars": len(car_ids), "owner": owner}
+    logger.info("owner_purged", owner_id=owner_id, **result)
+    return result
+
+
+def pending_owner_purges(limit: int) -> List[int]:
+    """Ca pending_car_purges, pentru owner-i (trăiesc în `default`)."""
+    older_than = timezone.now() - timedelta(minutes=settings.CAR_PURGE_SWEEP_GRACE_MINUTES)
+    return list(
+        Owner.objects.filter(deleted_at__lt=older_than).order_by("deleted_at")
+        .values_list("pk", flat=True)[:limit]
+    )
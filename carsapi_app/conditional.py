@@ -0,0 +1,107 @@
+# app/conditional.py
+from __future__ import annotations
+import hashlib
+from functools import partial
+from typing import Iterable, Sequence
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponseNotModified
+from django.utils.cache import parse_etags
+
+from .models import Claim, CollectionVersion, InsurancePolicy
+
+# modele ale căror colecții au ETag; numele e cheia din CollectionVersion
+VERSIONED_MODELS = {Claim: "claim", InsurancePolicy: "policy"}
+
+
+# ---------- VERSIUNI (update-uri și ștergeri) ----------
+def bump_collection_version(name: str) -> None:
+    # rândurile sunt create de migrarea 0008; get_or_create e doar plasă de siguranță
+    if not CollectionVersion.objects.filter(name=name).update(version=F("version") + 1):
+        CollectionVersion.objects.get_or_create(name=name, defaults={"version": 1})
+
+
+def schedule_bump(model, using=None) -> None:
+    """
+    Bump după commit (lock-ul pe rândul global nu se ține cât durează tranzacția de scriere),
+    o singură dată per tranzacție și colecție: un purge/arhivare de N rânduri face un singur UPDATE.
+    """
+    name = VERSIONED_MODELS[model]
+    conn = transaction.get_connection(using)
+    if conn.in_atomic_block and any(
+        getattr(func, "func", None) is bump_collection_version and func.args == (name,)
+        for _, func, _ in conn.run_on_commit
+    ):
+        return
+    transaction.on_commit(partial(bump_collection_version, name), using=using)
+
+
+def _on_save(sender, instance, created, using, **kwargs):
+    # insert-urile schimbă deja max id; doar update-urile au nevoie de bump
+    if not created:
+        schedule_bump(sender, using)
+
+
+def _on_delete(sender, instance, using, **kwargs):
+    # max id nu scade neapărat la ștergere; include cascade-urile și QuerySet.delete()
+    schedule_bump(sender, using)
+
+
+def connect_signals() -> None:
+    for model, name in VERSIONED_MODELS.items():
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"collection-version-{name}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"collection-version-delete-{name}")
+
+
+# ---------- ETAG ----------
+def collection_etag(request, querysets: Iterable, names: Sequence[str]) -> str:
+    """
+    ETag ieftin pentru o colecție: max(id) per queryset + versiunea colecției,
+    fără să randăm sau să hash-uim body-ul. Include path-ul cu query string
+    (pagina/filtrele) și Accept (JSON vs. browsable API).
+    Fără COUNT(*): ștergerile bump-uiesc versiunea, iar max(id) e un index scan
+    de la coada PK-ului (Postgres îl rescrie ca ORDER BY id DESC LIMIT 1).
+    """
+    parts = [request.get_full_path(), request.headers.get("Accept", "")]
+    for qs in querysets:
+        parts.append(qs.order_by().aggregate(max_id=Max("pk"))["max_id"])
+    versions = dict(CollectionVersion.objects.filter(name__in=names).values_list("name", "version"))
+    parts += [versions.get(n, 0) for n in names]
+    digest = hashlib.sha1(":".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request, etag: str) -> bool:
+    """If-None-Match cu comparație slabă (RFC 9110): W/"x" și "x" sunt aceeași versiune."""
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    if not tags:
+        return False
+    return tags == ["*"] or _opaque(etag) in {_opaque(t) for t in tags}
+
+
+def not_modified_response(etag: str) -> HttpResponseNotModified:
+    # răspuns Django simplu: modulul e importat din AppConfig.ready() și în worker, fără DRF
+    resp = HttpResponseNotModified()
+    resp["ETag"] = etag
+    return resp
+
+
+class ConditionalListMixin:
+    """list() cu ETag din collection_etag; 304 înainte de query-ul paginii."""
+    collection_version_names: Sequence[str] = ()
+
+    def list(self, request, *args, **kwargs):
+        etag = collection_etag(
+            request, [self.filter_queryset(self.get_queryset())], self.collection_version_names
+        )
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        resp = super().list(request, *args, **kwargs)
+        resp["ETag"] = etag
+        return resp
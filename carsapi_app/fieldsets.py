@@ -0,0 +1,82 @@
+# app/fieldsets.py
+from __future__ import annotations
+from typing import Optional, Set
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+# acțiunile pe care se aplică ?fields= / ?expand= (doar citiri)
+SPARSE_ACTIONS = ("list", "retrieve", "by_vin")
+
+
+def _param_set(request, name) -> Optional[Set[str]]:
+    raw = request.query_params.get(name) if request is not None else None
+    if raw is None:
+        return None
+    return {p.strip() for p in raw.split(",") if p.strip()}
+
+
+def requested_fields(request) -> Optional[Set[str]]:
+    """None = fără ?fields= sau ?fields= gol (toate câmpurile)."""
+    return _param_set(request, FIELDS_PARAM) or None
+
+
+def effective_expand(request, serializer_class) -> Set[str]:
+    """?expand= filtrat pe ce suportă serializer-ul; fără ?fields= se adaugă default_expand."""
+    expandable = set(getattr(serializer_class, "expandable_fields", {}))
+    expand = (_param_set(request, EXPAND_PARAM) or set()) & expandable
+    if requested_fields(request) is None:
+        expand |= set(getattr(serializer_class, "default_expand", ()))
+    return expand
+
+
+def optimize_queryset(qs, serializer_class, request):
+    """
+    Aliniază queryset-ul la câmpurile cerute: only() pe coloanele folosite,
+    select_related/prefetch_related doar pentru relațiile expandate. O relație
+    inversă cerută în ?fields= fără ?expand= (lista de id-uri) se prefetch-uiește
+    doar cu pk + FK.
+    """
+    fields = requested_fields(request)
+    expand = effective_expand(request, serializer_class)
+    select = [n for n in getattr(serializer_class, "expand_select_related", ()) if n in expand]
+    prefetch = [n for n in getattr(serializer_class, "expand_prefetch_related", ()) if n in expand]
+    collapsed = [
+        n for n in getattr(serializer_class, "expand_prefetch_related", ())
+        if fields is not None and n in fields and n not in expand
+    ]
+
+    qs = qs.select_related(None)
+    if select:
+        qs = qs.select_related(*select)
+    if prefetch:
+        qs = qs.prefetch_related(*prefetch)
+    for name in collapsed:
+        rel = qs.model._meta.get_field(name)
+        qs = qs.prefetch_related(
+            Prefetch(name, queryset=rel.related_model._default_manager.only("pk", rel.field.name))
+        )
+
+    if fields is not None:
+        columns = {"pk"}
+        for name in fields | set(select):
+            try:
+                field = qs.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete:
+                columns.add(field.name)
+        qs = qs.only(*columns)
+    return qs
+
+
+class SparseFieldsetViewMixin:
+    """get_queryset() optimizat după ?fields= / ?expand= pentru list/retrieve."""
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if getattr(self, "action", None) in SPARSE_ACTIONS:
+            qs = optimize_queryset(qs, self.get_serializer_class(), self.request)
+        return qs
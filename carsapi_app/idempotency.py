@@ -0,0 +1,101 @@
+# app/idempotency.py
+from __future__ import annotations
+import hashlib
+import json
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+import structlog
+
+from .models import IdempotencyRecord
+from . import sharding
+
+logger = structlog.get_logger()
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# headerele din răspuns care se păstrează pentru replay
+STORED_HEADERS = ("Location",)
+MAX_KEY_LENGTH = 255
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 3600))
+
+
+def _request_hash(request) -> str:
+    """Amprenta cererii: metodă + path + body canonic (chei sortate)."""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    raw = f"{request.method}:{request.path}:{body}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replay(record: IdempotencyRecord) -> Response:
+    resp = Response(record.response_body, status=record.status_code)
+    for name, value in record.response_headers.items():
+        resp[name] = value
+    resp[REPLAYED_HEADER] = "true"
+    return resp
+
+
+def idempotent_response(request, produce: Callable[[], Response]) -> Response:
+    """
+    Rulează `produce()` o singură dată per (Idempotency-Key, path).
+    Fără header -> comportament normal.
+
+    Recordul se inserează în aceeași tranzacție cu scrierea: un duplicat concurent
+    se blochează pe indexul unic până la commit-ul primei cereri și apoi primește
+    răspunsul salvat, deci se face o singură scriere.
+    Dacă `produce()` ridică excepție (ex. validare), tranzacția se anulează și
+    cheia rămâne liberă pentru un retry corectat.
+    În modul sharded recordul stă pe shard-ul fixat (al mașinii din path), ca să
+    fie în aceeași tranzacție cu scrierea.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return produce()
+
+    request_id = getattr(request, "id", None)
+    if len(key) > MAX_KEY_LENGTH:
+        logger.warning("idempotency_key_too_long", request_id=request_id, length=len(key))
+        return Response(
+            {"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    scope = request.path
+    fingerprint = _request_hash(request)
+    now = timezone.now()
+
+    with transaction.atomic(using=sharding.write_alias()):
+        # cheile expirate se tratează ca inexistente
+        IdempotencyRecord.objects.filter(key=key, scope=scope, expires_at__lte=now).delete()
+        record, created = IdempotencyRecord.objects.get_or_create(
+            key=key, scope=scope,
+            defaults={"request_hash": fingerprint, "expires_at": now + _ttl()},
+        )
+
+        if not created:
+            if record.request_hash != fingerprint:
+                logger.warning("idempotency_key_mismatch", request_id=request_id, key=key, scope=scope)
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request payload."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            logger.info("idempotency_replayed", request_id=request_id, key=key, scope=scope)
+            return _replay(record)
+
+        resp = produce()
+        record.status_code = resp.status_code
+        record.response_body = resp.data
+        record.response_headers = {h: resp[h] for h in STORED_HEADERS if resp.has_header(h)}
+        record.save(update_fields=["status_code", "response_body", "response_headers"])
+
+    logger.info("idempotency_stored", request_id=request_id, key=key, scope=scope, status_code=resp.status_code)
+    return resp
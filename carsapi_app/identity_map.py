@@ -0,0 +1,109 @@
+# app/identity_map.py
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from rest_framework import serializers
+
+
+class IdentityMap:
+    """Obiectele deja încărcate în request, după (model, pk)."""
+
+    def __init__(self):
+        self._objects: Dict[Tuple[str, object], models.Model] = {}
+
+    @staticmethod
+    def _key(model, pk) -> Tuple[str, object]:
+        return model._meta.concrete_model._meta.label, model._meta.pk.to_python(pk)
+
+    def get(self, model, pk) -> Optional[models.Model]:
+        return self._objects.get(self._key(model, pk))
+
+    def add(self, obj: models.Model) -> None:
+        if obj.pk is not None:
+            self._objects[self._key(type(obj), obj.pk)] = obj
+
+    def discard(self, obj: models.Model) -> None:
+        self._objects.pop(self._key(type(obj), obj.pk), None)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+
+_current: ContextVar[Optional[IdentityMap]] = ContextVar("identity_map", default=None)
+
+
+@contextmanager
+def request_identity_map():
+    """Activează un identity map nou pe durata blocului (un request / un task)."""
+    token = _current.set(IdentityMap())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    return _current.get()
+
+
+def remember(obj: Optional[models.Model], *related: str) -> None:
+    """
+    Înregistrează obj (și relațiile FK deja încărcate prin select_related, ex. "owner").
+    Fără identity map activ (shell, migrări) nu face nimic.
+    """
+    imap = _current.get()
+    if imap is None or obj is None:
+        return
+    imap.add(obj)
+    for name in related:
+        field = obj._meta.get_field(name)
+        if field.is_cached(obj):
+            remember(field.get_cached_value(obj))
+
+
+def lookup(model, pk) -> Optional[models.Model]:
+    imap = _current.get()
+    return imap.get(model, pk) if imap is not None else None
+
+
+class IdentityMapRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField care ia obiectul din identity map când e deja încărcat
+    în request; altfel query normal, iar rezultatul intră în map.
+    Un obiect din map nu trece prin filtrele querysetului: pentru un queryset restrâns,
+    `map_filter` aplică aceeași condiție în memorie (altfel se face query-ul normal).
+    """
+
+    def __init__(self, map_filter=None, **kwargs):
+        self.map_filter = map_filter
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        model = self.get_queryset().model
+        try:
+            obj = lookup(model, data)
+        except (TypeError, ValueError, DjangoValidationError):
+            # pk invalid -> mesajul de eroare standard vine din super()
+            obj = None
+        if obj is not None and (self.map_filter is None or self.map_filter(obj)):
+            return obj
+        obj = super().to_internal_value(data)
+        remember(obj)
+        return obj
+
+
+class IdentityMapViewMixin:
+    """get_object() pune obiectul (și relațiile din identity_map_related) în identity map."""
+
+    identity_map_related = ()
+
+    def get_object(self):
+        obj = super().get_object()
+        remember(obj, *self.identity_map_related)
+        return obj
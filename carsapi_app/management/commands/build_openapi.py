@@ -0,0 +1,23 @@
+# app/management/commands/build_openapi.py
+from django.core.management.base import BaseCommand, CommandError
+
+from carsapi_app.openapi import artifact_path, build_schema_artifact, code_version
+
+
+class Command(BaseCommand):
+    help = "Generează artefactul OpenAPI versionat (JSON + .gz/.br) pentru versiunea curentă a codului."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Nu generează; eșuează dacă artefactul versiunii curente lipsește.")
+
+    def handle(self, *args, **opts):
+        version = code_version()
+        if opts["check"]:
+            if not artifact_path(version).exists():
+                raise CommandError(f"OpenAPI artifact missing for version {version}")
+            self.stdout.write(f"ok {version}")
+            return
+
+        path = build_schema_artifact(version)
+        self.stdout.write(self.style.SUCCESS(f"OpenAPI schema {version} -> {path}"))
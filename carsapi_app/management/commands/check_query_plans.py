@@ -0,0 +1,92 @@
+# app/management/commands/check_query_plans.py
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.settings import api_settings
+
+from carsapi_app.query_plans import (
+    check_case, enumerate_cases, load_baseline, seed_allowed, seed_plan_data, write_baseline,
+)
+from carsapi_app.urls import router
+
+
+class Command(BaseCommand):
+    help = (
+        "Rulează EXPLAIN pe combinațiile filtru/ordonare/search ale viewset-urilor și eșuează "
+        "când o combinație pierde indexul sau depășește bugetul de cost, față de baseline-ul "
+        "planurilor acceptate (QUERY_PLAN_BASELINE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Generează N mașini sintetice (+ owneri, polițe, claim-uri) înainte de EXPLAIN.")
+        parser.add_argument("--basename", action="append", default=[],
+                            help="Doar aceste viewset-uri (repetabil, ex. --basename car).")
+        parser.add_argument("--budget", type=float, default=None,
+                            help="Suprascrie QUERY_PLAN_COST_BUDGET.")
+        parser.add_argument("--json", action="store_true", help="Output JSON (pentru CI).")
+        parser.add_argument("--baseline", default=None, help="Suprascrie QUERY_PLAN_BASELINE.")
+        parser.add_argument("--write-baseline", action="store_true",
+                            help="Acceptă planurile curente: rescrie baseline-ul pentru vendor-ul bazei.")
+
+    def handle(self, *args, **opts):
+        using = opts["database"]
+        vendor = connections[using].vendor
+        if vendor != "postgresql":
+            self.stderr.write(self.style.WARNING(
+                "Non-Postgres database: EXPLAIN QUERY PLAN only, no cost budget."
+            ))
+        if opts["seed"]:
+            if not seed_allowed(using, settings.QUERY_PLAN_SEED_HOSTS):
+                raise CommandError(
+                    f"Refusing to seed '{using}': not a local or test database "
+                    "(add its host to QUERY_PLAN_SEED_HOSTS if it is)."
+                )
+            counts = seed_plan_data(opts["seed"], using=using)
+            self.stderr.write(f"seeded {counts}")
+
+        registry = [r for r in router.registry if not opts["basename"] or r[2] in opts["basename"]]
+        budget = opts["budget"] if opts["budget"] is not None else settings.QUERY_PLAN_COST_BUDGET
+        results = []
+        for case in enumerate_cases(registry, using=using):
+            results += check_case(
+                case, using=using, page_size=api_settings.PAGE_SIZE or 100,
+                cost_budget=budget, allowlist=settings.QUERY_PLAN_ALLOWLIST,
+            )
+        baseline_path = opts["baseline"] or settings.QUERY_PLAN_BASELINE
+        if opts["write_baseline"]:
+            accepted = write_baseline(baseline_path, vendor, results)
+            self.stdout.write(f"baseline for {vendor}: {accepted} accepted plan(s) -> {baseline_path}")
+            return
+
+        baseline = load_baseline(baseline_path, vendor)
+        if baseline is None:
+            self.stderr.write(self.style.WARNING(f"No {vendor} baseline in {baseline_path}: every problem fails."))
+            baseline = {}
+        failed = [r for r in results if r.regressions(baseline)]
+        # acceptate în baseline, dar care acum trec (combinațiile nerulate nu contează)
+        fixed = sorted(r.key for r in results if r.key in baseline and not r.codes)
+
+        if opts["json"]:
+            self.stdout.write(json.dumps([
+                {
+                    "case": r.case.label, "query": r.query, "cost": r.cost, "seqScans": r.seq_scans,
+                    "sort": r.sorts, "problems": r.problems, "suggestions": r.suggestions,
+                    "regressions": r.regressions(baseline),
+                }
+                for r in results
+            ], indent=2))
+        else:
+            for r in failed:
+                self.stdout.write(f"FAIL {r.case.label} [{r.query}]: {'; '.join(r.problems)}")
+                for suggestion in r.suggestions:
+                    self.stdout.write(f"     suggest {suggestion}")
+            for key in fixed:
+                self.stdout.write(f"FIXED {key} (baseline can be tightened with --write-baseline)")
+            self.stdout.write(f"{len(results) - len(failed)}/{len(results)} plans ok or accepted")
+
+        if failed:
+            raise CommandError(f"{len(failed)} query plan(s) regressed")
@@ -0,0 +1,50 @@
+# app/management/commands/coldstart.py
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from carsapi.profiles import PROCESSES
+from .importtime import run_boot
+
+
+class Command(BaseCommand):
+    help = "Benchmark de cold start (interpretor nou + boot) pentru fiecare profil de proces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default=",".join(PROCESSES),
+                            help="Listă separată prin virgulă (implicit toate).")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--json", action="store_true", help="Output JSON (pentru CI / istoric).")
+
+    def handle(self, *args, **opts):
+        profiles = [p for p in opts["profiles"].split(",") if p]
+        unknown = set(profiles) - set(PROCESSES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for profile in profiles:
+            samples = []
+            for _ in range(max(opts["repeat"], 1)):
+                started = time.perf_counter()
+                proc = run_boot(profile)
+                elapsed = time.perf_counter() - started
+                if proc.returncode != 0:
+                    raise CommandError(f"{profile}: {proc.stderr.strip().splitlines()[-1]}")
+                samples.append(elapsed * 1000)
+            results[profile] = {
+                "median_ms": round(statistics.median(samples), 1),
+                "min_ms": round(min(samples), 1),
+                "max_ms": round(max(samples), 1),
+                "runs": len(samples),
+            }
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for profile, r in results.items():
+            self.stdout.write(
+                f"{profile:<7} median={r['median_ms']}ms min={r['min_ms']}ms max={r['max_ms']}ms runs={r['runs']}"
+            )
@@ -0,0 +1,79 @@
+# app/management/commands/importtime.py
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from carsapi.profiles import PROCESSES
+
+# ce importă fiecare tip de proces la pornire (aproximare a boot-ului real)
+BOOT_CODE = {
+    "web": (
+        "import django; django.setup(); "
+        "from django.urls import get_resolver; get_resolver().url_patterns"
+    ),
+    # validate_models() = ce face fixup-ul Django din Celery la pornire (setup + system checks)
+    "worker": (
+        "from carsapi.celery import app; from celery.fixups.django import DjangoWorkerFixup; "
+        "DjangoWorkerFixup(app).validate_models(); app.loader.import_default_modules()"
+    ),
+    "beat": (
+        "from carsapi.celery import app; from celery.fixups.django import DjangoWorkerFixup; "
+        "DjangoWorkerFixup(app).validate_models()"
+    ),
+    "cli": (
+        "import django; django.setup(); "
+        "from django.core.management import get_commands; get_commands()"
+    ),
+}
+
+
+def run_boot(profile: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    """Pornește un interpretor curat cu profilul dat și rulează codul de boot."""
+    env = {**os.environ, "CARSAPI_PROCESS": profile}
+    env.setdefault("DJANGO_SETTINGS_MODULE", "carsapi.settings")
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", BOOT_CODE[profile]]
+    return subprocess.run(cmd, env=env, capture_output=True, text=True)
+
+
+def parse_importtime(stderr: str):
+    """Parsează ieșirea `-X importtime` -> listă (modul, self_us, cumulative_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # un spațiu după "|", apoi indentarea pe niveluri de import
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Raport de import-time (python -X importtime) pentru boot-ul unui profil de proces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", choices=PROCESSES, default="web")
+        parser.add_argument("--top", type=int, default=25, help="Câte module să afișeze.")
+        parser.add_argument(
+            "--sort", choices=("cumulative", "self"), default="cumulative",
+        )
+
+    def handle(self, *args, **opts):
+        proc = run_boot(opts["profile"], importtime=True)
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "boot failed")
+
+        rows = parse_importtime(proc.stderr)
+        # modulele top-level (fără indentare) însumează tot timpul de import
+        total_us = sum(cum for name, _, cum in rows if not name.startswith(" "))
+        key = 2 if opts["sort"] == "cumulative" else 1
+        rows.sort(key=lambda r: r[key], reverse=True)
+
+        self.stdout.write(f"profile={opts['profile']} modules={len(rows)} total={total_us / 1000:.1f}ms")
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, self_us, cum_us in rows[: opts["top"]]:
+            self.stdout.write(f"{cum_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
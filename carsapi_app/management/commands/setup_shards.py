@@ -0,0 +1,35 @@
+# app/management/commands/setup_shards.py
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from carsapi_app import sharding
+from carsapi_app.models import Owner
+
+
+class Command(BaseCommand):
+    help = (
+        "Inițializează shard-urile din OWNER_SHARDS: migrări pe fiecare bază, "
+        "id-uri intercalate (Postgres) și copiile ownerilor din `default`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skip-migrate", action="store_true")
+
+    def handle(self, *args, **opts):
+        if not sharding.enabled():
+            raise CommandError("OWNER_SHARDS is not configured.")
+
+        aliases = sharding.shard_aliases()
+        for alias in [DEFAULT_DB_ALIAS] + [a for a in aliases if a != DEFAULT_DB_ALIAS]:
+            if not opts["skip_migrate"]:
+                call_command("migrate", database=alias, verbosity=0)
+            if alias in aliases and connections[alias].vendor == "postgresql":
+                sharding.align_sequences(alias)
+            self.stdout.write(f"{alias}: ready")
+
+        replicated = 0
+        for owner in Owner.objects.using(DEFAULT_DB_ALIAS).iterator(chunk_size=2000):
+            sharding.replicate_owner(owner)
+            replicated += 1
+        self.stdout.write(self.style.SUCCESS(f"{len(aliases)} shards, {replicated} owners replicated"))
@@ -0,0 +1,87 @@
+# app/middleware/compression.py
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:  # opționale: br/zstd doar dacă pachetele sunt instalate
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# ordinea de preferință la egalitate de q
+PREFERENCE = ("br", "zstd", "gzip")
+
+
+def available_encodings():
+    found = []
+    if brotli is not None:
+        found.append("br")
+    if zstandard is not None:
+        found.append("zstd")
+    found.append("gzip")
+    return found
+
+
+def preferred_encoding(request, available):
+    """Alege encoding-ul din Accept-Encoding (respectă q=0); None dacă nu se acceptă nimic."""
+    accepted = {}
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.strip()
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            continue
+        accepted[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compress(encoding, content):
+    if encoding == "br":
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(content)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware + br/zstd negociat și prag de mărime configurabil
+    (COMPRESSION_MIN_SIZE). Răspunsurile streaming și gzip trec prin
+    implementarea Django; br/zstd doar pentru răspunsuri ne-streaming.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        available = ["gzip"] if response.streaming else available_encodings()
+        encoding = preferred_encoding(request, available)
+        if encoding == "gzip":
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding is None:
+            return response
+
+        compressed = _compress(encoding, response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
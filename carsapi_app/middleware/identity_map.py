@@ -0,0 +1,13 @@
+# app/middleware/identity_map.py
+from carsapi_app.identity_map import request_identity_map
+
+
+class IdentityMapMiddleware:
+    """Un identity map per request: Car/Owner deja încărcate nu se mai citesc încă o dată."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_identity_map():
+            return self.get_response(request)
@@ -0,0 +1,16 @@
+# app/middleware/sharding.py
+from carsapi_app.sharding import pin_shard
+
+
+class ShardPinMiddleware:
+    """
+    Resetează shard-ul fixat la începutul fiecărui request. Nu-l resetează la ieșire:
+    răspunsurile streaming (history, claims) citesc din shard după ce view-ul a returnat.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin_shard(None)
+        return self.get_response(request)
@@ -0,0 +1,31 @@
+# app/middleware/sql_latency.py
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from carsapi_app.throttling import sql_latency
+
+
+def _timed_execute(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sql_latency.record((time.perf_counter() - started) * 1000)
+
+
+class SqlLatencyMiddleware:
+    """
+    Măsoară fiecare query SQL din request, pe toate conexiunile (default + shard-uri),
+    și alimentează EWMA-ul folosit la load shedding.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(_timed_execute))
+            return self.get_response(request)
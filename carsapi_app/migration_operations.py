@@ -0,0 +1,34 @@
+# app/migration_operations.py
+from django.db import NotSupportedError, migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex cu CREATE INDEX CONCURRENTLY pe Postgres (nu blochează scrierile).
+    Pe alte baze (SQLite în dev/teste) e un AddIndex obișnuit.
+    Migrarea care o folosește trebuie să aibă atomic = False."""
+
+    def describe(self):
+        return "Concurrently " + super().describe()
+
+    def _check_postgres(self, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return False
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                "AddIndexConcurrently cere o migrare non-atomică (atomic = False)."
+            )
+        return True
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._check_postgres(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._check_postgres(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from carsapi_app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # indexul pe claim_date se creează CONCURRENTLY pe Postgres (tabel mare)
+    atomic = False
+
+    dependencies = [
+        ('carsapi_app', '0004_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('make', models.CharField(blank=True, max_length=100)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('provider', models.CharField(blank=True, max_length=100, null=True)),
+                ('claim_count', models.PositiveIntegerField()),
+                ('amount_sum', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('amount_min', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount_max', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='claim',
+            index=models.Index(fields=['claim_date'], name='carsapi_app_claim_d_d67e17_idx'),
+        ),
+        migrations.AddField(
+            model_name='claimdailyrollup',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='carsapi_app.owner'),
+        ),
+        migrations.AddIndex(
+            model_name='claimdailyrollup',
+            index=models.Index(fields=['day'], name='carsapi_app_day_71ccc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimdailyrollup',
+            index=models.Index(fields=['refreshed_at'], name='carsapi_app_refresh_fa2cf4_idx'),
+        ),
+    ]
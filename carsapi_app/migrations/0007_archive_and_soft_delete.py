@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carsapi_app', '0006_collectionversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('car_id', models.BigIntegerField()),
+                ('claim_date', models.DateField()),
+                ('description', models.TextField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['car_id', 'claim_date'], name='carsapi_app_car_id_7a96a3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedInsurancePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('car_id', models.BigIntegerField()),
+                ('provider', models.CharField(blank=True, max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('expiry_logged_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['car_id', 'start_date'], name='carsapi_app_car_id_2ca985_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+VERSION_NAMES = ("claim", "policy")
+
+
+def create_rows(apps, schema_editor):
+    CollectionVersion = apps.get_model("carsapi_app", "CollectionVersion")
+    db = schema_editor.connection.alias
+    for name in VERSION_NAMES:
+        CollectionVersion.objects.using(db).get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carsapi_app', '0007_archive_and_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rows, migrations.RunPython.noop),
+    ]
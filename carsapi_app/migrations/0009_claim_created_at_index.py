@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:23
+
+from django.db import migrations, models
+
+from carsapi_app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('carsapi_app', '0008_collectionversion_rows'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='claim',
+            index=models.Index(fields=['created_at'], name='carsapi_app_created_ff367c_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+import re
+
+from django.db import migrations
+
+# copie a carsapi_app.vin.normalize_vin (migrările nu importă codul aplicației)
+_SEPARATORS = re.compile(r"[\s-]+")
+_VIN_RE = re.compile(r"^[A-Z0-9]{1,17}$")
+
+
+def _normalize(vin):
+    normalized = _SEPARATORS.sub("", vin).upper()
+    return normalized if _VIN_RE.match(normalized) else None
+
+
+def normalize_vins(apps, schema_editor):
+    """
+    VIN-urile scrise înainte de VinField (litere mici, spații, cratime) -> forma normalizată,
+    ca by-vin / resolve-vins / verificarea de unicitate să le găsească. Dacă două mașini
+    ajung la același VIN, migrarea eșuează cu lista lor: trebuie rezolvate manual.
+    VIN-urile care nu se pot normaliza (alte caractere) rămân neschimbate.
+    """
+    Car = apps.get_model("carsapi_app", "Car")
+    db = schema_editor.connection.alias
+    cars = Car.objects.using(db)
+
+    changes = {}
+    for pk, vin in cars.filter(vin__regex=r"[a-z\s-]").values_list("pk", "vin").iterator():
+        normalized = _normalize(vin)
+        if normalized is not None and normalized != vin:
+            changes[pk] = normalized
+    if not changes:
+        return
+
+    claimed = {}
+    for pk, normalized in changes.items():
+        claimed.setdefault(normalized, []).append(pk)
+    for pk, vin in cars.filter(vin__in=list(claimed)).exclude(pk__in=list(changes)).values_list("pk", "vin"):
+        claimed[vin].append(pk)
+    collisions = {vin: sorted(pks) for vin, pks in claimed.items() if len(pks) > 1}
+    if collisions:
+        details = "; ".join(f"{vin}: car ids {pks}" for vin, pks in sorted(collisions.items()))
+        raise RuntimeError(f"VIN normalization collisions on '{db}', resolve them first: {details}")
+
+    objs = [Car(pk=pk, vin=vin) for pk, vin in changes.items()]
+    cars.bulk_update(objs, ["vin"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carsapi_app', '0009_claim_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_vins, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carsapi_app', '0010_normalize_vins'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
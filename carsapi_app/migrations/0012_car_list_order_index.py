@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+from carsapi_app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('carsapi_app', '0011_owner_deleted_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='car',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-year_of_manufacture', 'make', 'model'], name='car_live_list_order_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carsapi_app', '0012_car_list_order_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardIdSequence',
+            fields=[
+                ('table', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 import datetime
 # Create your models here.
 def current_year():
@@ -10,16 +11,51 @@ def current_year():
 class Owner(models.Model):
     owner_name = models.CharField(max_length= 50)
     owner_email = models.EmailField(null=True, blank=True)
+    # soft delete: mașinile owner-ului se șterg asincron, apoi owner-ul (tasks.purge_owner)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return self.owner_name
     
+class VersionedQuerySet(models.QuerySet):
+    """
+    QuerySet pentru colecțiile cu ETag (conditional.VERSIONED_MODELS): update() și
+    bulk_update() nu trimit post_save, deci bump-uiesc explicit versiunea colecției.
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            from .conditional import schedule_bump
+            schedule_bump(self.model, self.db)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if rows:
+            from .conditional import schedule_bump
+            schedule_bump(self.model, self.db)
+        return rows
+
+
 class Car(models.Model):
     vin = models.CharField(max_length=17, unique=True)
     make = models.CharField(max_length=100, blank= True)
     model = models.CharField(max_length=100,blank= True)
     year_of_manufacture = models.PositiveSmallIntegerField(validators=[MinValueValidator(1886), MaxValueValidator(current_year)], null=True, blank=True)
     owner= models.ForeignKey(Owner, on_delete=models.CASCADE, null=False, related_name='cars')
+    # soft delete: rândurile dependente se șterg asincron, în batch-uri (tasks.purge_car)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # ordonarea implicită a listei (CarViewSet): pagina citește indexul în ordine, cu search
+        # filtrat din mers, fără seq scan + sort; doar mașinile vizibile
+        indexes = [
+            models.Index(
+                fields=['-year_of_manufacture', 'make', 'model'], name='car_live_list_order_idx',
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
 
 class InsurancePolicy(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='policies')
@@ -27,6 +63,8 @@ class InsurancePolicy(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
 
+    objects = VersionedQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -42,9 +80,13 @@ class Claim(models.Model):
     amount = models.DecimalField( max_digits=12, decimal_places=2, 
                                 validators=[MinValueValidator(0.01)])
     created_at = models.DateTimeField(auto_now_add= True, null = False)
+
+    objects = VersionedQuerySet.as_manager()
     
     class Meta:
         ordering = ['-claim_date']
+        # created_at: refresh-ul incremental al rollup-urilor filtrează pe el
+        indexes = [models.Index(fields=['claim_date']), models.Index(fields=['created_at'])]
     
 class PolicyExpiryLog(models.Model):
     policy = models.ForeignKey(InsurancePolicy, on_delete=models.CASCADE)
@@ -56,5 +98,77 @@ class PolicyExpiryLog(models.Model):
         ]
         indexes = [models.Index(fields=['logged_expiry_at'])]
 
-    
-    
\ No newline at end of file
+
+class IdempotencyRecord(models.Model):
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'scope'], name='uniq_idempotency_key_scope')
+        ]
+        indexes = [models.Index(fields=['expires_at'])]
+
+
+class ClaimDailyRollup(models.Model):
+    day = models.DateField()
+    make = models.CharField(max_length=100, blank=True)
+    model = models.CharField(max_length=100, blank=True)
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='+')
+    provider = models.CharField(max_length=100, null=True, blank=True)
+    claim_count = models.PositiveIntegerField()
+    amount_sum = models.DecimalField(max_digits=18, decimal_places=2)
+    amount_min = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_max = models.DecimalField(max_digits=12, decimal_places=2)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['refreshed_at']),
+        ]
+
+
+class CollectionVersion(models.Model):
+    # contor per resursă, incrementat la update-uri și ștergeri (insert-urile se văd din max id)
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+
+class ShardIdSequence(models.Model):
+    # ultimul id intercalat alocat per tabel, pe shard-urile fără secvențe (SQLite); vezi sharding._assign_id
+    table = models.CharField(max_length=100, primary_key=True)
+    last_id = models.BigIntegerField()
+
+
+# ---------- ARHIVĂ (fără FK: nu participă la cascade, car_id e doar referință) ----------
+class ArchivedInsurancePolicy(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    car_id = models.BigIntegerField()
+    provider = models.CharField(max_length=100, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    expiry_logged_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['car_id', 'start_date'])]
+
+
+class ArchivedClaim(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    car_id = models.BigIntegerField()
+    claim_date = models.DateField()
+    description = models.TextField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['car_id', 'claim_date'])]
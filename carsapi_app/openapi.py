@@ -0,0 +1,120 @@
+# app/openapi.py
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+import structlog
+
+try:  # opțional: varianta .br se generează doar dacă e instalat `brotli`
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = structlog.get_logger()
+
+# fișierele care dau forma schemei (rute, view-uri, serializere, modele, REST_FRAMEWORK);
+# testele, migrările, task-urile și middleware-ul nu o schimbă, deci nu invalidează artefactul
+_SCHEMA_SOURCES = (
+    "carsapi/settings.py",
+    "carsapi/urls.py",
+    "carsapi_app/urls.py",
+    "carsapi_app/views.py",
+    "carsapi_app/serializers.py",
+    "carsapi_app/pagination.py",
+    "carsapi_app/models.py",
+)
+_GENERATOR_DISTS = ("drf-spectacular", "djangorestframework", "django-filter", "Django")
+# encoding HTTP -> extensia fișierului precomprimat
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass(frozen=True)
+class SchemaArtifact:
+    version: str
+    etag: str
+    # "identity" / "gzip" / "br" -> bytes
+    bodies: Dict[str, bytes]
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """
+    Versiunea codului pentru invalidarea schemei: APP_VERSION (ex. git SHA din build)
+    + hash peste _SCHEMA_SOURCES și versiunile pachetelor care generează schema.
+    Orice modificare de view/serializer => altă versiune => alt artefact.
+    """
+    h = hashlib.sha256()
+    for name in _SCHEMA_SOURCES:
+        h.update(name.encode())
+        h.update((Path(settings.BASE_DIR) / name).read_bytes())
+    for dist in _GENERATOR_DISTS:
+        try:
+            h.update(f"{dist}=={metadata.version(dist)}".encode())
+        except metadata.PackageNotFoundError:
+            pass
+    prefix = getattr(settings, "APP_VERSION", "") or "src"
+    return f"{prefix}-{h.hexdigest()[:16]}"
+
+
+def artifact_path(version: str) -> Path:
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f"schema-{version}.json"
+
+
+def generate_schema_json() -> bytes:
+    """Introspecție completă (lentă) — pentru build și fallback-ul de debug."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer
+
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return OpenApiJsonRenderer().render(schema, renderer_context={})
+
+
+def build_schema_artifact(version: Optional[str] = None) -> Path:
+    """Scrie schema-<version>.json + variantele .gz/.br + manifestul cu ETag."""
+    version = version or code_version()
+    body = generate_schema_json()
+    path = artifact_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    path.write_bytes(body)
+    path.with_name(path.name + ENCODINGS["gzip"]).write_bytes(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ENCODINGS["br"]).write_bytes(brotli.compress(body, quality=11))
+
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    meta = {"version": version, "etag": etag, "size": len(body)}
+    path.with_suffix(".meta.json").write_text(json.dumps(meta))
+    _artifacts.pop(version, None)
+    logger.info("openapi_schema_built", version=version, size=len(body), path=str(path))
+    return path
+
+
+# artefactele găsite, per versiune; lipsurile nu se cache-uiesc (build_openapi poate rula după boot)
+_artifacts: Dict[str, SchemaArtifact] = {}
+
+
+def load_schema_artifact(version: str) -> Optional[SchemaArtifact]:
+    """Artefactul pentru versiunea dată, ținut în memorie; None dacă lipsește."""
+    artifact = _artifacts.get(version)
+    if artifact is not None:
+        return artifact
+    path = artifact_path(version)
+    meta_path = path.with_suffix(".meta.json")
+    if not path.exists() or not meta_path.exists():
+        return None
+
+    bodies = {"identity": path.read_bytes()}
+    for encoding, ext in ENCODINGS.items():
+        variant = path.with_name(path.name + ext)
+        if variant.exists():
+            bodies[encoding] = variant.read_bytes()
+    meta = json.loads(meta_path.read_text())
+    artifact = _artifacts[version] = SchemaArtifact(version=version, etag=meta["etag"], bodies=bodies)
+    return artifact
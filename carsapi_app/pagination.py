@@ -0,0 +1,32 @@
+# app/pagination.py
+from rest_framework.pagination import PageNumberPagination
+
+from .sharding import CURSOR_PARAM
+
+
+class ShardAwarePagination(PageNumberPagination):
+    """
+    Paginarea viewset-urilor cu ShardRoutingMixin. Fără sharding e PageNumberPagination.
+    Cu OWNER_SHARDS, list() e scatter-gather cu cursor keyset și răspunde cu
+    {next, previous, results}: fără `count` (ar cere un COUNT pe fiecare shard),
+    `previous` mereu null, `next` poartă `cursor` în loc de `page`.
+    Schema (un singur artefact pentru ambele moduri) descrie ambele forme.
+    """
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["required"] = ["results"]
+        schema["properties"]["count"]["description"] = (
+            "Total number of rows. Omitted on top-level lists in owner-sharded mode (OWNER_SHARDS), "
+            "which page with a keyset cursor instead."
+        )
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            "name": CURSOR_PARAM,
+            "required": False,
+            "in": "query",
+            "description": "Keyset cursor taken from `next`; owner-sharded mode only (replaces `page`).",
+            "schema": {"type": "string"},
+        }]
@@ -0,0 +1,359 @@
+# app/query_plans.py
+from __future__ import annotations
+import json
+import random
+from fnmatch import fnmatch
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connections, models
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+# valori de probă per tip de câmp, pentru parametrii de filtrare (FK: un pk real din tabelă)
+_SAMPLE_VALUES = (
+    (models.DateTimeField, "2024-01-01T00:00:00Z"),
+    (models.DateField, "2024-01-01"),
+    (models.EmailField, "a@example.com"),
+    (models.DecimalField, "10.00"),
+    (models.IntegerField, "2015"),
+    (models.CharField, "a"),
+    (models.TextField, "a"),
+)
+_PATTERN_LOOKUPS = ("icontains", "contains", "iexact", "istartswith", "iendswith")
+
+
+@dataclass
+class PlanCase:
+    basename: str
+    viewset: Any
+    params: Dict[str, str]
+    # (lookup path, lookup) per filtru + ordonare, pentru sugestii de index
+    filters: List[Tuple[str, str]] = field(default_factory=list)
+    ordering: Optional[str] = None
+    search: bool = False
+    # parametri cu valoare luată din bază (pk-uri FK): în label apar ca <pk>, stabil între baze
+    sampled: Tuple[str, ...] = ()
+
+    @property
+    def label(self) -> str:
+        query = "&".join(
+            f"{k}={'<pk>' if k in self.sampled else v}" for k, v in sorted(self.params.items())
+        )
+        return f"{self.basename}?{query}" if query else self.basename
+
+
+@dataclass
+class PlanResult:
+    case: PlanCase
+    query: str  # "page" / "count"
+    cost: Optional[float]
+    seq_scans: List[str]
+    sorts: bool
+    problems: List[str] = field(default_factory=list)
+    # forma stabilă a problemelor (fără costuri), comparată cu baseline-ul
+    codes: List[str] = field(default_factory=list)
+    suggestions: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f"{self.case.label}:{self.query}"
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def regressions(self, baseline: Dict[str, List[str]]) -> List[str]:
+        """Problemele care nu sunt deja acceptate în baseline pentru această combinație."""
+        accepted = set(baseline.get(self.key, ()))
+        return [code for code in self.codes if code not in accepted]
+
+
+# ---------- ENUMERARE ----------
+def _resolve_path(model, path: str):
+    """`owner__owner_name` -> (Owner, câmpul owner_name)."""
+    parts = path.split("__")
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model, model._meta.get_field(parts[-1])
+
+
+def _sample_value(model_field, using: str) -> Optional[str]:
+    """None = nu există o valoare validă (FK spre o tabelă goală) -> filtrul se sare."""
+    if isinstance(model_field, models.ForeignKey):
+        pk = (
+            model_field.related_model._default_manager.using(using)
+            .order_by("pk").values_list("pk", flat=True).first()
+        )
+        return None if pk is None else str(pk)
+    for field_class, value in _SAMPLE_VALUES:
+        if isinstance(model_field, field_class):
+            return value
+    return "1"
+
+
+def _filter_params(viewset, using: str) -> List[Tuple[str, str, str, str]]:
+    """(param, valoare, path, lookup) pentru fiecare filtru declarat în filterset_fields."""
+    declared = getattr(viewset, "filterset_fields", None) or []
+    if not isinstance(declared, dict):
+        declared = {name: ["exact"] for name in declared}
+    model = viewset.queryset.model
+    out = []
+    for path, lookups in declared.items():
+        _, model_field = _resolve_path(model, path)
+        value = _sample_value(model_field, using)
+        if value is None:
+            continue
+        for lookup in lookups:
+            param = path if lookup == "exact" else f"{path}__{lookup}"
+            out.append((param, value, path, lookup))
+    return out
+
+
+def enumerate_cases(registry, using: str = "default") -> List[PlanCase]:
+    """
+    Combinații per viewset: baseline, fiecare filtru / ordonare / search singure,
+    plus perechile filtru x ordonare și search x ordonare (nu tot produsul cartezian).
+    """
+    cases: List[PlanCase] = []
+    for _prefix, viewset, basename in registry:
+        filters = _filter_params(viewset, using)
+        model = viewset.queryset.model
+        sampled = tuple(
+            p for p, _, path, _ in filters if isinstance(_resolve_path(model, path)[1], models.ForeignKey)
+        )
+        orderings = [
+            o for f in (getattr(viewset, "ordering_fields", None) or []) for o in (f, f"-{f}")
+        ]
+        has_search = bool(getattr(viewset, "search_fields", None))
+        ordering_param = api_settings.ORDERING_PARAM
+        search_param = api_settings.SEARCH_PARAM
+
+        def make(filter_items=(), ordering=None, search=False):
+            params = {p: v for p, v, _, _ in filter_items}
+            if ordering:
+                params[ordering_param] = ordering
+            if search:
+                params[search_param] = "a"
+            return PlanCase(
+                basename=basename, viewset=viewset, params=params,
+                filters=[(path, lookup) for _, _, path, lookup in filter_items],
+                ordering=ordering, search=search,
+                sampled=tuple(p for p in params if p in sampled),
+            )
+
+        cases.append(make())
+        cases += [make(filter_items=[f]) for f in filters]
+        cases += [make(ordering=o) for o in orderings]
+        if has_search:
+            cases.append(make(search=True))
+            cases += [make(ordering=o, search=True) for o in orderings]
+        cases += [make(filter_items=[f], ordering=o) for f, o in product(filters, orderings)]
+    return cases
+
+
+# ---------- EXPLAIN ----------
+def build_querysets(case: PlanCase, page_size: int):
+    """Queryset-urile reale ale list(): pagina (LIMIT) și COUNT-ul paginatorului."""
+    request = APIRequestFactory().get("/", case.params)
+    view = case.viewset(action_map={"get": "list"})
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    view.request = view.initialize_request(request)
+    view.headers = {}
+    qs = view.filter_queryset(view.get_queryset())
+    return qs[:page_size], qs.order_by()
+
+
+def _sql(qs) -> Tuple[str, tuple]:
+    return qs.query.get_compiler(using=qs.db).as_sql()
+
+
+def explain_postgres(sql: str, params, using: str) -> Dict[str, Any]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        raw = cursor.fetchone()[0]
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return plan[0]["Plan"]
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def analyze_postgres(sql, params, using) -> Tuple[Optional[float], List[str], bool]:
+    plan = explain_postgres(sql, params, using)
+    seq = sorted({n["Relation Name"] for n in _walk(plan) if n["Node Type"] == "Seq Scan"})
+    sorts = any(n["Node Type"] in ("Sort", "Incremental Sort") for n in _walk(plan))
+    return plan["Total Cost"], seq, sorts
+
+
+def analyze_sqlite(sql, params, using) -> Tuple[Optional[float], List[str], bool]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+    seq = sorted({d.split()[1] for d in details if d.startswith("SCAN ") and "USING" not in d})
+    sorts = any("TEMP B-TREE" in d for d in details)
+    return None, seq, sorts
+
+
+# ---------- SUGESTII ----------
+def _index_suggestion(model, columns: List[str]) -> str:
+    name_cols = ", ".join(f'"{c}"' for c in columns)
+    return f"{model.__name__}: models.Index(fields=[{name_cols}])"
+
+
+def suggest_indexes(case: PlanCase) -> List[str]:
+    model = case.viewset.queryset.model
+    suggestions = []
+    btree_cols: List[str] = []
+    target = model
+    for path, lookup in case.filters:
+        rel_model, model_field = _resolve_path(model, path)
+        if lookup in _PATTERN_LOOKUPS:
+            suggestions.append(
+                f"{rel_model.__name__}: GinIndex(fields=[\"{model_field.name}\"], "
+                f"opclasses=[\"gin_trgm_ops\"])  # necesită extensia pg_trgm"
+            )
+        elif rel_model is model:
+            btree_cols.append(model_field.name)
+        else:
+            target = rel_model
+            suggestions.append(_index_suggestion(rel_model, [model_field.name]))
+    if case.search:
+        for path in case.viewset.search_fields:
+            rel_model, model_field = _resolve_path(model, path.lstrip("^=@$"))
+            suggestions.append(
+                f"{rel_model.__name__}: GinIndex(fields=[\"{model_field.name}\"], "
+                f"opclasses=[\"gin_trgm_ops\"])  # search (icontains)"
+            )
+    orderings = [case.ordering] if case.ordering else list(getattr(case.viewset, "ordering", None) or [])
+    btree_cols += [o for o in orderings if o]
+    if btree_cols and target is model:
+        suggestions.append(_index_suggestion(model, btree_cols))
+    return list(dict.fromkeys(suggestions))
+
+
+# ---------- RULARE ----------
+def is_allowed(label: str, allowlist) -> bool:
+    """Allowlist pe "<label>:<page|count>", cu wildcard-uri (ex. "car?search=*:count")."""
+    return any(fnmatch(label, pattern) for pattern in allowlist)
+
+
+def check_case(case: PlanCase, *, using: str, page_size: int, cost_budget: float,
+               allowlist=()) -> List[PlanResult]:
+    vendor = connections[using].vendor
+    analyze = analyze_postgres if vendor == "postgresql" else analyze_sqlite
+    page_qs, count_qs = build_querysets(case, page_size)
+
+    page_sql, page_params = _sql(page_qs)
+    count_sql, count_params = _sql(count_qs.values("pk"))
+    queries = [
+        ("page", page_sql, page_params),
+        ("count", f"SELECT COUNT(*) FROM ({count_sql}) AS _plan_count", count_params),
+    ]
+    # COUNT fără filtre parcurge oricum tot tabelul
+    unfiltered = not case.filters and not case.search
+
+    results = []
+    for name, sql, params in queries:
+        cost, seq, sorts = analyze(sql, params, using)
+        result = PlanResult(case=case, query=name, cost=cost, seq_scans=seq, sorts=sorts)
+        if is_allowed(f"{case.label}:{name}", allowlist):
+            results.append(result)
+            continue
+        if seq and not (name == "count" and unfiltered):
+            result.problems.append(f"sequential scan on {', '.join(seq)}")
+            result.codes += [f"seq_scan:{table}" for table in seq]
+        if name == "page" and sorts:
+            result.problems.append("ORDER BY not served by an index (explicit sort)")
+            result.codes.append("sort")
+        if cost is not None and cost > cost_budget:
+            result.problems.append(f"cost {cost:.0f} > budget {cost_budget:.0f}")
+            result.codes.append("cost")
+        if result.problems:
+            result.suggestions = suggest_indexes(case)
+        results.append(result)
+    return results
+
+
+# ---------- BASELINE ----------
+def load_baseline(path, vendor: str) -> Optional[Dict[str, List[str]]]:
+    """Planurile acceptate azi pentru vendor-ul dat; None dacă nu există încă."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return None
+    return data.get(vendor)
+
+
+def write_baseline(path, vendor: str, results: List[PlanResult]) -> int:
+    """Rescrie secțiunea vendor-ului cu problemele curente (celelalte secțiuni rămân)."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        data = {}
+    data[vendor] = {r.key: sorted(r.codes) for r in sorted(results, key=lambda r: r.key) if r.codes}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True, ensure_ascii=False)
+        fh.write("\n")
+    return len(data[vendor])
+
+
+# ---------- DATE DE PROBĂ ----------
+_LOCAL_HOSTS = ("", "localhost", "127.0.0.1", "::1")
+
+
+def seed_allowed(using: str, extra_hosts=()) -> bool:
+    """
+    --seed scrie date sintetice: doar pe SQLite sau pe un server local / declarat în
+    QUERY_PLAN_SEED_HOSTS. Numele bazei nu contează (un `test_*` poate sta pe serverul de producție).
+    """
+    conn = connections[using]
+    if conn.vendor == "sqlite":
+        return True
+    return (conn.settings_dict.get("HOST") or "") in (*_LOCAL_HOSTS, *extra_hosts)
+
+
+def seed_plan_data(cars: int, *, using: str = "default", seed: int = 42) -> Dict[str, int]:
+    """Date sintetice (volum realist) ca planner-ul să aleagă ca în producție."""
+    from .models import Owner, Car, InsurancePolicy, Claim
+
+    rnd = random.Random(seed)
+    makes = ["Dacia", "Ford", "VW", "Toyota", "BMW", "Skoda", "Renault", "Opel"]
+    owners = Owner.objects.using(using).bulk_create(
+        [Owner(owner_name=f"owner-{i}", owner_email=f"o{i}@example.com") for i in range(max(cars // 10, 1))],
+        batch_size=5000,
+    )
+    start_id = (Car.objects.using(using).aggregate(m=models.Max("id"))["m"] or 0) + 1
+    car_objs = Car.objects.using(using).bulk_create(
+        [
+            Car(
+                vin=f"SEED{start_id + i:013d}", make=rnd.choice(makes), model=f"M{rnd.randint(1, 40)}",
+                year_of_manufacture=rnd.randint(1990, 2024), owner=rnd.choice(owners),
+            )
+            for i in range(cars)
+        ],
+        batch_size=5000,
+    )
+    base = date(2015, 1, 1)
+    policies, claims = [], []
+    for car in car_objs:
+        start = base + timedelta(days=rnd.randint(0, 3000))
+        policies.append(InsurancePolicy(car=car, provider=rnd.choice(["A", "B", "C"]),
+                                        start_date=start, end_date=start + timedelta(days=365)))
+        for _ in range(2):
+            claims.append(Claim(car=car, claim_date=base + timedelta(days=rnd.randint(0, 3500)),
+                                description="seed", amount=Decimal(rnd.randint(100, 100000)) / 100))
+    InsurancePolicy.objects.using(using).bulk_create(policies, batch_size=5000)
+    Claim.objects.using(using).bulk_create(claims, batch_size=5000)
+    if connections[using].vendor == "postgresql":
+        with connections[using].cursor() as cursor:
+            cursor.execute("ANALYZE")
+    return {"owners": len(owners), "cars": len(car_objs), "policies": len(policies), "claims": len(claims)}
@@ -1,16 +1,75 @@
 from rest_framework import serializers
-from .models import Car, Owner, InsurancePolicy, Claim, PolicyExpiryLog
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.validators import UniqueValidator
+from .models import Car, Owner, InsurancePolicy, Claim, PolicyExpiryLog, ArchivedInsurancePolicy
+from .archive import archive_cutoff
+from .fieldsets import requested_fields, effective_expand
+from .identity_map import IdentityMapRelatedField
+from . import sharding
 from datetime import date
 
+
+class SparseFieldsMixin:
+    """
+    ?fields=a,b păstrează doar câmpurile cerute; ?expand=x,y înlocuiește relația
+    cu obiectul nested (expandable_fields). O relație cerută în ?fields= dar
+    neexpandată rămâne doar id (collapsed_fields). Se aplică doar la citiri.
+    """
+    expandable_fields = {}
+    collapsed_fields = {}
+    default_expand = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        fields = requested_fields(request)
+        expand = effective_expand(request, type(self))
+        for name, factory in self.expandable_fields.items():
+            if name in expand:
+                self.fields[name] = factory()
+            elif name in self.collapsed_fields and (name in self.fields or fields and name in fields):
+                self.fields[name] = self.collapsed_fields[name]()
+            else:
+                self.fields.pop(name, None)
+
+        if fields is not None:
+            keep = fields | expand
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+
+def _is_live(obj) -> bool:
+    # obiectele din identity map trec aceeași condiție ca querysetul (deleted_at__isnull=True)
+    return obj.deleted_at is None
+
+
 class OwnerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Owner
-        fields = '__all__'
+        exclude = ["deleted_at"]
+
+class VinField(serializers.CharField):
+    """Normalizează VIN-ul (uppercase, fără spații/cratime) înainte de validarea de unicitate."""
+
+    def to_internal_value(self, data):
+        from .vin import normalize_vin
 
-class CarSerializer(serializers.ModelSerializer):
+        vin = normalize_vin(super().to_internal_value(data))
+        if vin is None:
+            raise serializers.ValidationError("Invalid VIN (1-17 letters/digits).")
+        return vin
+
+
+class CarSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    vin = VinField(max_length=17, validators=[UniqueValidator(queryset=Car.objects.all())])
     owner = OwnerSerializer(read_only=True)
-    owner_id = serializers.PrimaryKeyRelatedField(
-        source="owner", queryset=Owner.objects.all(), write_only=True
+    owner_id = IdentityMapRelatedField(
+        source="owner", queryset=Owner.objects.filter(deleted_at__isnull=True),
+        map_filter=_is_live, write_only=True
     )
     year_of_manufacture = serializers.IntegerField(
         min_value=1886, max_value=2100, required=False, allow_null=True
@@ -23,13 +82,50 @@ class CarSerializer(serializers.ModelSerializer):
             "owner", "owner_id"
         ]
 
+    # owner rămâne nested implicit (compatibil); policies doar cu ?expand=policies
+    expandable_fields = {
+        "owner": lambda: OwnerSerializer(read_only=True),
+        "policies": lambda: InsurancePolicySerializer(many=True, read_only=True),
+    }
+    collapsed_fields = {
+        "owner": lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        "policies": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    }
+    default_expand = ("owner",)
+    expand_select_related = ("owner",)
+    expand_prefetch_related = ("policies",)
+
+    def validate_vin(self, value):
+        # UniqueValidator vede doar shard-ul curent; VIN-ul trebuie să fie unic pe toate
+        if sharding.enabled():
+            exclude_pk = getattr(self.instance, "pk", None)
+            taken = sharding.scatter_first(
+                lambda alias: Car.objects.using(alias).filter(vin=value).exclude(pk=exclude_pk)
+                .values_list("pk", flat=True).first()
+            )
+            if taken is not None:
+                raise serializers.ValidationError("car with this vin already exists.")
+        return value
+
+    def validate(self, attrs):
+        owner = attrs.get("owner")
+        if sharding.enabled() and self.instance is not None and owner is not None:
+            if sharding.shard_for_owner(owner.pk) != sharding.shard_for_owner(self.instance.owner_id):
+                raise serializers.ValidationError(
+                    {"owner_id": "Moving a car to an owner on another shard is not supported."}
+                )
+        return attrs
+
 MIN_YEAR, MAX_YEAR = 1900, 2100
 
 def _check_year_range(d: date, field: str):
     if d.year < MIN_YEAR or d.year > MAX_YEAR:
         raise serializers.ValidationError({field: f"Year must be in [{MIN_YEAR}..{MAX_YEAR}]."})
 
-class InsurancePolicySerializer(serializers.ModelSerializer):
+class InsurancePolicySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # mașina e de obicei deja încărcată în request (nested POST, PATCH); nu una ștearsă
+    car = IdentityMapRelatedField(queryset=Car.objects.filter(deleted_at__isnull=True), map_filter=_is_live)
+
     class Meta:
         model = InsurancePolicy
         fields = ["id", "car", "provider", "start_date", "end_date"]
@@ -52,13 +148,21 @@ class InsurancePolicySerializer(serializers.ModelSerializer):
             qs = InsurancePolicy.objects.filter(car=car)
             if self.instance:
                 qs = qs.exclude(pk=self.instance.pk)
-            if qs.filter(start_date__lte=end, end_date__gte=start).exists():
+            overlaps = qs.filter(start_date__lte=end, end_date__gte=start).exists()
+            # arhiva are doar polițe încheiate înainte de cutoff: se verifică doar dacă intervalul ajunge acolo
+            if not overlaps and start < archive_cutoff():
+                overlaps = ArchivedInsurancePolicy.objects.filter(
+                    car_id=car.pk, start_date__lte=end, end_date__gte=start,
+                ).exists()
+            if overlaps:
                 raise serializers.ValidationError(
                     "Policy interval overlaps an existing policy for this car."
                 )
         return attrs
 
-class ClaimSerializer(serializers.ModelSerializer):
+class ClaimSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    car = IdentityMapRelatedField(queryset=Car.objects.filter(deleted_at__isnull=True), map_filter=_is_live)
+
     class Meta:
         model = Claim
         fields = ["id", "claim_date", "description", "car", "amount", "created_at"]
@@ -71,6 +175,27 @@ class ClaimSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"description": "Description must not be empty."})
         return attrs
 
+# ---------- HISTORY (doar pentru schema OpenAPI; rândurile vin din services.iter_car_history) ----------
+class HistoryPolicyEntrySerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=["POLICY"])
+    policyId = serializers.IntegerField()
+    startDate = serializers.DateField()
+    endDate = serializers.DateField()
+    provider = serializers.CharField(allow_blank=True)
+
+
+class HistoryClaimEntrySerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=["CLAIM"])
+    claimId = serializers.IntegerField()
+    claimDate = serializers.DateField()
+    # string zecimal exact, ca ClaimSerializer.amount; până la streaming era number (float)
+    amount = serializers.DecimalField(
+        max_digits=12, decimal_places=2, coerce_to_string=True,
+        help_text="Exact decimal string (e.g. \"120.50\"), same as Claim.amount. Was a JSON number before.",
+    )
+    description = serializers.CharField()
+
+
 class PolicyExpiryLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = PolicyExpiryLog
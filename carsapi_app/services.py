@@ -1,28 +1,41 @@
 # app/services.py
 from __future__ import annotations
-from dataclasses import dataclass
+import heapq
 from datetime import date
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from django.db import transaction
 from django.utils import timezone
 
-from .models import Car, InsurancePolicy, Claim, PolicyExpiryLog
+from .models import (
+    Owner, Car, InsurancePolicy, Claim, PolicyExpiryLog, IdempotencyRecord,
+    ArchivedInsurancePolicy, ArchivedClaim,
+)
 from .serializers import InsurancePolicySerializer, ClaimSerializer
+from .identity_map import remember
+from .vin import vin_cache
+from . import conditional, sharding
 import structlog
 
 logger = structlog.get_logger()
 
 # ---------- VALIDITY ----------
 def is_insured_on_date(car: Car, target: date) -> bool:
-    """True dacă există o poliță activă pentru car la data target (inclusiv capete)."""
-    return InsurancePolicy.objects.filter(
+    """
+    True dacă există o poliță activă pentru car la data target (inclusiv capete).
+    Pentru date vechi, polițele pot fi deja în arhivă (read-through la miss).
+    """
+    if InsurancePolicy.objects.filter(
         car=car, start_date__lte=target, end_date__gte=target
+    ).exists():
+        return True
+    return ArchivedInsurancePolicy.objects.filter(
+        car_id=car.pk, start_date__lte=target, end_date__gte=target
     ).exists()
 
 
 # ---------- POLICIES ----------
-@transaction.atomic
+@sharding.atomic
 def create_policy_for_car(
     car: Car, *, provider: Optional[str], start_date: date, end_date: date
 ) -> InsurancePolicy:
@@ -30,6 +43,8 @@ def create_policy_for_car(
     Creează o poliță pentru mașină.
     Validările (end>=start, 1900..2100, anti-suprapunere) sunt în serializer.
     """
+    # serializer-ul rezolvă "car" din identity map, fără încă un SELECT pe Car
+    remember(car)
     payload = {
         "car": car.pk,
         "provider": provider or "",
@@ -44,11 +59,12 @@ def create_policy_for_car(
 
 
 # ---------- CLAIMS ----------
-@transaction.atomic
+@sharding.atomic
 def create_claim_for_car(
     car: Car, *, claim_date: date, description: str, amount: str | float
 ) -> Claim:
     """Creează un claim pentru mașină (validări în serializer)."""
+    remember(car)
     payload = {
         "car": car.pk,
         "claim_date": claim_date,
@@ -61,45 +77,123 @@ def create_claim_for_car(
 
 
 # ---------- HISTORY ----------
-@dataclass
-class HistoryItem:
-    sort_key: str
-    payload: Dict[str, Any]
-
-def get_car_history(car: Car) -> List[Dict[str, Any]]:
-    """Timeline combinat POLICIES + CLAIMS, ordonat ascendent după dată."""
-    items: List[HistoryItem] = []
-
-    for p in car.policies.all():
-        items.append(HistoryItem(
-            sort_key=str(p.start_date),
-            payload={
-                "type": "POLICY",
-                "policyId": p.id,
-                "startDate": str(p.start_date),
-                "endDate": str(p.end_date),
-                "provider": p.provider or "",
-            },
-        ))
-
-    for c in car.claims.all():
-        items.append(HistoryItem(
-            sort_key=str(c.claim_date),
-            payload={
-                "type": "CLAIM",
-                "claimId": c.id,
-                "claimDate": str(c.claim_date),
-                "amount": float(c.amount),
-                "description": c.description,
-            },
-        ))
-
-    items.sort(key=lambda x: x.sort_key)
-    return [x.payload for x in items]
+HISTORY_CHUNK_SIZE = 2000
+
+
+def _policy_history_items(model, car: Car) -> Iterator[Dict[str, Any]]:
+    id_field = "original_id" if model is ArchivedInsurancePolicy else "id"
+    rows = (
+        model.objects.filter(car_id=car.pk).order_by("start_date", id_field)
+        .values_list(id_field, "start_date", "end_date", "provider")
+    )
+    for pid, start, end, provider in rows.iterator(chunk_size=HISTORY_CHUNK_SIZE):
+        yield {
+            "type": "POLICY",
+            "policyId": pid,
+            "startDate": str(start),
+            "endDate": str(end),
+            "provider": provider or "",
+        }
+
+
+def _claim_history_items(model, car: Car) -> Iterator[Dict[str, Any]]:
+    id_field = "original_id" if model is ArchivedClaim else "id"
+    rows = (
+        model.objects.filter(car_id=car.pk).order_by("claim_date", id_field)
+        .values_list(id_field, "claim_date", "amount", "description")
+    )
+    for cid, claim_date, amount, description in rows.iterator(chunk_size=HISTORY_CHUNK_SIZE):
+        yield {
+            "type": "CLAIM",
+            "claimId": cid,
+            "claimDate": str(claim_date),
+            "amount": str(amount),  # Decimal exact, ca în ClaimSerializer
+            "description": description,
+        }
+
+
+def _history_sort_key(item: Dict[str, Any]) -> str:
+    return item.get("startDate") or item["claimDate"]
+
+
+def iter_car_history(car: Car, include_archived: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Timeline combinat POLICIES + CLAIMS, ordonat ascendent după dată.
+    Merge între cursoare deja sortate în DB -> memorie constantă;
+    la aceeași dată polițele vin înaintea claim-urilor.
+    `include_archived` adaugă și rândurile mutate în arhivă.
+    """
+    sources = [_policy_history_items(InsurancePolicy, car)]
+    if include_archived:
+        sources.append(_policy_history_items(ArchivedInsurancePolicy, car))
+    sources.append(_claim_history_items(Claim, car))
+    if include_archived:
+        sources.append(_claim_history_items(ArchivedClaim, car))
+    return heapq.merge(*sources, key=_history_sort_key)
+
+
+def get_car_history(car: Car, include_archived: bool = False) -> List[Dict[str, Any]]:
+    """Varianta materializată (listă) a iter_car_history."""
+    return list(iter_car_history(car, include_archived=include_archived))
+
+
+# ---------- CAR DELETE (asincron) ----------
+def schedule_car_deletion(car: Car) -> None:
+    """
+    Soft delete (deleted_at) + job Celery care șterge dependențele în batch-uri,
+    în loc de un singur cascade sincron. Jobul pornește după commit; dacă broker-ul
+    nu răspunde, îl re-programează sweep-ul periodic (tasks.purge_deleted_cars).
+    """
+    Car.objects.filter(pk=car.pk, deleted_at__isnull=True).update(deleted_at=timezone.now())
+    _hide_car_dependents([car.pk], sharding.write_alias())
+
+    def _enqueue():
+        from .tasks import purge_car
+        try:
+            purge_car.delay(car.pk)
+        except Exception as exc:
+            logger.warning("car_purge_enqueue_failed", car_id=car.pk, error=str(exc))
+
+    transaction.on_commit(_enqueue, using=sharding.write_alias())
+    logger.info("car_deletion_scheduled", car_id=car.pk)
+
+
+def _hide_car_dependents(car_ids: List[int], using: str) -> None:
+    # polițele/claim-urile mașinilor șterse ies din liste -> ETag-urile colecțiilor se schimbă
+    conditional.schedule_bump(InsurancePolicy, using)
+    conditional.schedule_bump(Claim, using)
+    for car_id in car_ids:
+        vin_cache.evict_id(car_id)
+
+
+def schedule_owner_deletion(owner: Owner) -> None:
+    """
+    Ca schedule_car_deletion, pentru un owner: soft delete pe owner și pe mașinile lui,
+    apoi tasks.purge_owner șterge mașinile în batch-uri și la final owner-ul.
+    Mașinile rămase nemarcate (crash între cele două update-uri) le marchează purge-ul.
+    """
+    now = timezone.now()
+    Owner.objects.filter(pk=owner.pk, deleted_at__isnull=True).update(deleted_at=now)
+    with sharding.use_shard(sharding.shard_for_owner(owner.pk)) as alias:
+        car_ids = list(
+            Car.objects.filter(owner_id=owner.pk, deleted_at__isnull=True).values_list("pk", flat=True)
+        )
+        Car.objects.filter(pk__in=car_ids).update(deleted_at=now)
+        _hide_car_dependents(car_ids, alias)
+
+    def _enqueue():
+        from .tasks import purge_owner
+        try:
+            purge_owner.delay(owner.pk)
+        except Exception as exc:
+            logger.warning("owner_purge_enqueue_failed", owner_id=owner.pk, error=str(exc))
+
+    transaction.on_commit(_enqueue, using=Owner.objects.db)
+    logger.info("owner_deletion_scheduled", owner_id=owner.pk, cars=len(car_ids))
 
 
 # ---------- EXPIRY (util pt. job-ul de background) ----------
-@transaction.atomic
+@sharding.atomic
 def detect_and_log_expired_policies(run_date: Optional[date] = None) -> int:
     """
     Marchează o singură dată polițele care AU EXPIRAT la `run_date` (sau azi dacă e None).
@@ -110,7 +204,7 @@ def detect_and_log_expired_policies(run_date: Optional[date] = None) -> int:
     # polițe care au end_date == azi și nu sunt încă logate
     to_log = (
         InsurancePolicy.objects
-        .filter(end_date=today)
+        .filter(end_date=today, car__deleted_at__isnull=True)
         .exclude(id__in=PolicyExpiryLog.objects.values("policy_id"))
         .select_related("car")
     )
@@ -119,3 +213,12 @@ def detect_and_log_expired_policies(run_date: Optional[date] = None) -> int:
         PolicyExpiryLog.objects.create(policy=p)
         created += 1
     return created
+
+
+# ---------- IDEMPOTENCY (curățare chei expirate) ----------
+def purge_expired_idempotency_records(now=None) -> int:
+    """Șterge recordurile Idempotency-Key expirate. Returnează numărul șters."""
+    deleted, _ = IdempotencyRecord.objects.filter(
+        expires_at__lte=now or timezone.now()
+    ).delete()
+    return deleted
@@ -0,0 +1,433 @@
+# app/sharding.py
+"""
+Mod sharded pe owner (OWNER_SHARDS): Car/Policy/Claim/ExpiryLog (+ arhivele) stau
+pe shard-ul owner-ului, Owner rămâne în `default` (directorul global) cu o copie
+pe shard-ul lui, pentru FK și select_related.
+
+Id-urile sunt intercalate: id % N == indexul shard-ului, deci orice /cars/{id},
+/policies/{id}, /claims/{id} se rutează fără lookup suplimentar.
+
+Listele de top (/cars/, /policies/, /claims/, /policy-expiry-logs/) schimbă forma răspunsului:
+{next, previous, results} cu cursor keyset, fără `count` (vezi ShardRoutingMixin).
+
+Recordurile Idempotency-Key stau pe shard-ul fixat în request (al mașinii), în
+aceeași tranzacție cu scrierea. Analytics/rollups nu sunt disponibile în modul sharded.
+"""
+from __future__ import annotations
+import base64
+import datetime
+import heapq
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cmp_to_key, wraps
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Max, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+# fără importuri DRF la nivel de modul: AppConfig.ready() încarcă modulul și în worker/beat
+from .conditional import collection_etag, is_not_modified, not_modified_response
+from .models import (
+    Owner, Car, InsurancePolicy, Claim, PolicyExpiryLog,
+    ArchivedInsurancePolicy, ArchivedClaim, IdempotencyRecord, ShardIdSequence,
+)
+
+# modele care stau pe shard + câmpul din care se deduce shard-ul
+SHARDED_MODELS = {
+    Car: "owner_id",
+    InsurancePolicy: "car_id",
+    Claim: "car_id",
+    PolicyExpiryLog: "policy_id",
+    ArchivedInsurancePolicy: "car_id",
+    ArchivedClaim: "car_id",
+}
+# modele fără cheie de shard proprie: stau pe shard-ul fixat (sau în `default`, fără pin)
+PINNED_MODELS = (IdempotencyRecord,)
+# modele cu id intercalat (rutate după pk în URL)
+INTERLEAVED_MODELS = (Car, InsurancePolicy, Claim, PolicyExpiryLog)
+CURSOR_PARAM = "cursor"
+
+_pinned: ContextVar[Optional[str]] = ContextVar("pinned_shard", default=None)
+
+
+# ---------- TOPOLOGIE ----------
+def enabled() -> bool:
+    return bool(getattr(settings, "OWNER_SHARDS", None))
+
+
+def shard_aliases() -> List[str]:
+    """Alias-urile shard-urilor; fără sharding doar `default`."""
+    return list(settings.OWNER_SHARDS) if enabled() else [DEFAULT_DB_ALIAS]
+
+
+def shard_for_id(pk) -> str:
+    """Shard-ul unui id intercalat (car/policy/claim/expiry log) sau al unui owner."""
+    aliases = shard_aliases()
+    return aliases[int(pk) % len(aliases)]
+
+
+shard_for_owner = shard_for_id
+
+
+def _parse_pk(raw) -> Optional[int]:
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- PIN (shard-ul curent al request-ului / task-ului) ----------
+def pinned_shard() -> Optional[str]:
+    return _pinned.get()
+
+
+def pin_shard(alias: Optional[str]) -> None:
+    """Fixează shard-ul până la următorul pin (middleware-ul îl resetează per request)."""
+    _pinned.set(alias)
+
+
+@contextmanager
+def use_shard(alias: Optional[str]):
+    token = _pinned.set(alias)
+    try:
+        yield alias
+    finally:
+        _pinned.reset(token)
+
+
+def write_alias() -> str:
+    return _pinned.get() or DEFAULT_DB_ALIAS
+
+
+def atomic(func=None):
+    """
+    transaction.atomic pe shard-ul curent (alias-ul se rezolvă la apel, nu la import).
+    `with atomic():` sau `@atomic`.
+    """
+    if func is None:
+        return transaction.atomic(using=write_alias())
+
+    @wraps(func)
+    def inner(*args, **kwargs):
+        with transaction.atomic(using=write_alias()):
+            return func(*args, **kwargs)
+    return inner
+
+
+# ---------- ROUTER ----------
+def _shard_from_instance(instance) -> Optional[str]:
+    model = type(instance)._meta.concrete_model
+    if model in SHARDED_MODELS:
+        if instance._state.db in settings.OWNER_SHARDS:
+            return instance._state.db
+        key = getattr(instance, SHARDED_MODELS[model], None)
+        return shard_for_id(key) if key is not None else None
+    if model is Owner and instance.pk is not None:
+        return shard_for_owner(instance.pk)
+    return None
+
+
+class OwnerShardRouter:
+    """
+    Modelele sharded: shard-ul instanței (hint) sau shard-ul fixat în request/task.
+    Owner: `default`, cu excepția accesului prin relație de pe un shard (car.owner).
+    PINNED_MODELS (idempotency): shard-ul fixat. Restul (rollups, versiuni) rămâne în `default`.
+    """
+
+    def _route(self, model, **hints):
+        model = model._meta.concrete_model
+        if model in PINNED_MODELS:
+            return _pinned.get()
+        if model not in SHARDED_MODELS and model is not Owner:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and (model is not Owner or type(instance) in SHARDED_MODELS):
+            shard = _shard_from_instance(instance)
+            if shard is not None:
+                return shard
+        if model is Owner:
+            return None
+        return _pinned.get()
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Owner din `default` are copie pe fiecare shard al mașinilor lui
+        if isinstance(obj1, Owner) or isinstance(obj2, Owner):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # aceeași schemă peste tot (simplu de migrat, tabelele nefolosite rămân goale)
+        return None
+
+
+# ---------- ID-URI INTERCALATE ----------
+def next_interleaved_id(model, alias: str) -> int:
+    """Primul id > max(id) de pe shard cu id % N == indexul shard-ului."""
+    aliases = shard_aliases()
+    n, index = len(aliases), aliases.index(alias)
+    current = model.objects.using(alias).aggregate(m=Max("pk"))["m"] or 0
+    return current + ((index - current) % n or n)
+
+
+def allocate_interleaved_id(model, alias: str) -> int:
+    """
+    Următorul id intercalat pe un shard fără secvențe: contorul din ShardIdSequence crește cu N
+    în tranzacția INSERT-ului. UPDATE-ul ia lock-ul de scriere înainte de citire, deci doi
+    writeri nu primesc același id (un max(id) citit fără lock putea fi același pentru amândoi).
+    """
+    n = len(shard_aliases())
+    table = model._meta.db_table
+    counter = ShardIdSequence.objects.using(alias).filter(table=table)
+    with transaction.atomic(using=alias):
+        if not counter.update(last_id=F("last_id") + n):
+            # primul id alocat pe shard: contorul pornește de la rândurile existente
+            ShardIdSequence.objects.using(alias).get_or_create(
+                table=table, defaults={"last_id": next_interleaved_id(model, alias) - n},
+            )
+            counter.update(last_id=F("last_id") + n)
+        return counter.values_list("last_id", flat=True).get()
+
+
+def _assign_id(sender, instance, raw=False, using=None, **kwargs):
+    # Postgres: secvențele sunt configurate de `setup_shards` (INCREMENT BY N).
+    # Restul (SQLite local): contorul din ShardIdSequence.
+    if raw or instance.pk is not None or using not in settings.OWNER_SHARDS:
+        return
+    if connections[using].vendor == "postgresql":
+        return
+    instance.pk = allocate_interleaved_id(sender, using)
+
+
+def align_sequences(alias: str) -> None:
+    """Postgres: identity-urile sharded pornesc de la indexul shard-ului, cu pas N."""
+    aliases = shard_aliases()
+    with connections[alias].cursor() as cursor:
+        for model in INTERLEAVED_MODELS:
+            start = next_interleaved_id(model, alias)
+            cursor.execute(
+                f'ALTER TABLE "{model._meta.db_table}" ALTER COLUMN "id" '
+                f"SET INCREMENT BY {len(aliases)} RESTART WITH {start}"
+            )
+
+
+# ---------- OWNER (director în default + copie pe shard) ----------
+def replicate_owner(owner: Owner) -> None:
+    shard = shard_for_owner(owner.pk)
+    if shard == owner._state.db:
+        return
+    Owner.objects.using(shard).update_or_create(
+        pk=owner.pk,
+        defaults={"owner_name": owner.owner_name, "owner_email": owner.owner_email},
+    )
+
+
+def _on_owner_saved(sender, instance, raw=False, **kwargs):
+    # doar scrierile din director; copia de pe shard nu se mai replică
+    if not raw and instance._state.db == DEFAULT_DB_ALIAS:
+        replicate_owner(instance)
+
+
+def _on_owner_deleted(sender, instance, **kwargs):
+    shard = shard_for_owner(instance.pk)
+    if instance._state.db == DEFAULT_DB_ALIAS and shard != DEFAULT_DB_ALIAS:
+        # cascade pe shard: mașinile owner-ului și tot ce ține de ele
+        Owner.objects.using(shard).filter(pk=instance.pk).delete()
+
+
+def connect_signals() -> None:
+    if not enabled():
+        return
+    post_save.connect(_on_owner_saved, sender=Owner, dispatch_uid="owner-shard-replica-save")
+    post_delete.connect(_on_owner_deleted, sender=Owner, dispatch_uid="owner-shard-replica-delete")
+    for model in INTERLEAVED_MODELS:
+        pre_save.connect(_assign_id, sender=model, dispatch_uid=f"shard-id-{model._meta.model_name}")
+
+
+# ---------- SCATTER-GATHER ----------
+def _value(obj, path: str):
+    for part in path.split("__"):
+        obj = getattr(obj, part) if obj is not None else None
+    return obj
+
+
+def _compare(a, b) -> int:
+    # NULL-urile la final, indiferent de direcție (ca în order_by(nulls_last=True))
+    if a == b:
+        return 0
+    if a is None:
+        return 1
+    if b is None:
+        return -1
+    return -1 if a < b else 1
+
+
+def _order_keys(ordering: Sequence[str]):
+    keys = [(o.lstrip("-"), o.startswith("-")) for o in ordering if o and o != "?"]
+    keys = [("pk" if name == "id" else name, desc) for name, desc in keys]
+    if not any(name == "pk" for name, _ in keys):
+        keys.append(("pk", False))
+    return keys
+
+
+def _order_by(keys):
+    return [F(n).desc(nulls_last=True) if d else F(n).asc(nulls_last=True) for n, d in keys]
+
+
+def _nullable(model, path: str) -> bool:
+    if path == "pk":
+        return False
+    parts = path.split("__")
+    for part in parts[:-1]:
+        field = model._meta.get_field(part)
+        if field.null:
+            return True
+        model = field.related_model
+    return model._meta.get_field(parts[-1]).null
+
+
+def _after(model, keys, values) -> Q:
+    """Condiția keyset: rândurile strict după `values` în ordinea `keys` (NULL la final)."""
+    (name, desc), rest = keys[0], keys[1:]
+    value = values[0]
+    tail = _after(model, rest, values[1:]) if rest else Q(pk__in=[])
+    if value is None:
+        return Q(**{f"{name}__isnull": True}) & tail
+    beyond = Q(**{f"{name}__{'lt' if desc else 'gt'}": value})
+    if _nullable(model, name):
+        beyond |= Q(**{f"{name}__isnull": True})
+    return beyond | (Q(**{name: value}) & tail)
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder taie datetime-urile la milisecunde -> rânduri duplicate/sărite la graniță
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token: str, size: int):
+    from rest_framework.exceptions import NotFound
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise NotFound("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise NotFound("Invalid cursor")
+    return values
+
+
+def merged_page(model, querysets, ordering: Sequence[str], cursor: Optional[str], page_size: int):
+    """
+    O pagină globală din N shard-uri: fiecare shard dă primele page_size+1 rânduri
+    după cursor (keyset, fără OFFSET), apoi merge pe aceeași ordine.
+    Returnează (rânduri, cursorul următor sau None).
+    """
+    keys = _order_keys(ordering)
+    after = _after(model, keys, decode_cursor(cursor, len(keys))) if cursor else None
+    streams = []
+    for qs in querysets:
+        qs = qs.order_by(*_order_by(keys))
+        if after is not None:
+            qs = qs.filter(after)
+        streams.append(list(qs[: page_size + 1]))
+
+    def cmp(a, b):
+        for name, desc in keys:
+            va, vb = _value(a, name), _value(b, name)
+            c = _compare(va, vb)
+            if c:
+                return -c if desc and va is not None and vb is not None else c
+        return 0
+
+    merged = list(heapq.merge(*streams, key=cmp_to_key(cmp)))
+    page = merged[:page_size]
+    next_cursor = None
+    if len(merged) > page_size:
+        next_cursor = encode_cursor([_value(page[-1], name) for name, _ in keys])
+    return page, next_cursor
+
+
+def _load_columns(qs, names: Sequence[str]):
+    """only()/defer() (?fields=) fără să amâne coloanele de ordonare: merge-ul le citește pe fiecare rând."""
+    fields, defer = qs.query.deferred_loading
+    if not fields:
+        return qs
+    if not defer:
+        return qs.only(*fields, *names)
+    qs = qs.all()
+    qs.query.clear_deferred_loading()
+    kept = set(fields) - set(names)
+    return qs.defer(*kept) if kept else qs
+
+
+class ShardRoutingMixin:
+    """
+    Fixează shard-ul request-ului înainte de handler: după pk-ul din URL (detaliu,
+    acțiuni nested) sau, la create, după `shard_key_field` din body.
+    list() fără pk devine scatter-gather cu cursor keyset: răspunsul e {next, previous, results},
+    fără `count` și cu `?cursor=` în loc de `?page=` (documentat în schema de
+    pagination.ShardAwarePagination, pe care viewset-urile o folosesc).
+    """
+    shard_key_field: Optional[str] = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not enabled():
+            return
+        pk = _parse_pk(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if pk is None and self.action == "create" and self.shard_key_field:
+            pk = _parse_pk(request.data.get(self.shard_key_field))
+        if pk is not None:
+            pin_shard(shard_for_id(pk))
+
+    def list(self, request, *args, **kwargs):
+        if not enabled():
+            return super().list(request, *args, **kwargs)
+        from rest_framework.filters import OrderingFilter
+        from rest_framework.response import Response
+        from rest_framework.settings import api_settings
+        from rest_framework.utils.urls import replace_query_param
+
+        base = self.filter_queryset(self.get_queryset())
+        ordering = OrderingFilter().get_ordering(request, base, self) or list(base.model._meta.ordering)
+        base = _load_columns(base, [name for name, _ in _order_keys(ordering)])
+        querysets = [base.using(alias) for alias in shard_aliases()]
+        names = getattr(self, "collection_version_names", ())
+        etag = collection_etag(request, querysets, names) if names else None
+        if etag and is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        page, next_cursor = merged_page(
+            base.model, querysets, ordering, request.query_params.get(CURSOR_PARAM), api_settings.PAGE_SIZE or 100,
+        )
+        next_url = (
+            replace_query_param(request.build_absolute_uri(), CURSOR_PARAM, next_cursor) if next_cursor else None
+        )
+        data = self.get_serializer(page, many=True).data
+        resp = Response({"next": next_url, "previous": None, "results": data})
+        if etag:
+            resp["ETag"] = etag
+        return resp
+
+
+def scatter_first(queryset_for):
+    """Primul rezultat ne-None din shard-uri (lookup după o cheie unică globală, ex. VIN)."""
+    for alias in shard_aliases():
+        found = queryset_for(alias)
+        if found is not None:
+            return found
+    return None
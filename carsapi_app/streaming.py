@@ -0,0 +1,64 @@
+# app/streaming.py
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+import structlog
+
+logger = structlog.get_logger()
+
+# câte bytes adunăm înainte să dăm un chunk către server
+FLUSH_BYTES = 64 * 1024
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def iter_json_array(rows: Iterable[Dict[str, Any]], max_bytes: int) -> Iterator[bytes]:
+    """
+    Randează rows ca array JSON, incremental (memorie constantă).
+    Decimal -> string exact (DjangoJSONEncoder), nu float.
+    Peste `max_bytes` stream-ul se întrerupe cu eroare: clientul primește un răspuns
+    incomplet, nu un JSON valid dar trunchiat în tăcere.
+    """
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    buf = bytearray(b"[")
+    sent = 0
+    first = True
+    for row in rows:
+        item = encoder.encode(row).encode("utf-8")
+        if not first:
+            buf += b","
+        buf += item
+        first = False
+        if len(buf) >= FLUSH_BYTES:
+            sent += len(buf)
+            if sent > max_bytes:
+                logger.error("stream_response_too_large", max_bytes=max_bytes, sent=sent)
+                raise ResponseTooLarge(f"response exceeded {max_bytes} bytes")
+            yield bytes(buf)
+            buf.clear()
+    buf += b"]"
+    if sent + len(buf) > max_bytes:
+        logger.error("stream_response_too_large", max_bytes=max_bytes, sent=sent + len(buf))
+        raise ResponseTooLarge(f"response exceeded {max_bytes} bytes")
+    yield bytes(buf)
+
+
+def serialize_rows(serializer_class, queryset, context, chunk_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    """Serializează rând cu rând dintr-un cursor chunked (o singură instanță de serializer)."""
+    serializer = serializer_class(context=context)
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(obj)
+
+
+def stream_json_array(rows: Iterable[Dict[str, Any]], status: int = 200) -> StreamingHttpResponse:
+    return StreamingHttpResponse(
+        iter_json_array(rows, settings.STREAMING_MAX_RESPONSE_BYTES),
+        status=status,
+        content_type="application/json",
+    )
+
@@ -2,7 +2,9 @@
 from celery import shared_task
 import structlog
 from django.utils import timezone
-from carsapi_app.services import detect_and_log_expired_policies
+
+# services/analytics (DRF, serializers, modele) se importă în task, nu la
+# autodiscover, ca pornirea worker-ului să rămână ieftină
 
 logger = structlog.get_logger(__name__)
 @shared_task(name="app.tasks.policy_expiry_scan", max_retries=3, default_retry_delay=30)
@@ -11,11 +13,108 @@ def policy_expiry_scan():
     if now.hour != 0:   # doar în fereastra 00:00–00:59
         return 0
 
+    from carsapi_app.services import detect_and_log_expired_policies
+    from carsapi_app.sharding import shard_aliases, use_shard
+
+    # fiecare shard se scanează separat (fără sharding: doar `default`)
+    created = 0
+    for alias in shard_aliases():
+        try:
+            with use_shard(alias):
+                shard_created = detect_and_log_expired_policies()
+        except Exception as exc:
+            logger.error("policy_expiry_scan_failed", shard=alias, error=str(exc))
+            raise
+        logger.info("policy_expiry_scan_done", shard=alias, created=shard_created, run_date=str(timezone.localdate()))
+        created += shard_created
+    return created
+
+
+@shared_task(name="app.tasks.purge_idempotency_keys")
+def purge_idempotency_keys():
+    from carsapi_app.services import purge_expired_idempotency_records
+    from carsapi_app.sharding import enabled, shard_aliases, use_shard
+
+    # în modul sharded recordurile stau pe shard-uri; `default` le are doar pe cele fără pin
+    aliases = [None, *shard_aliases()] if enabled() else [None]
+    deleted = 0
+    for alias in aliases:
+        with use_shard(alias):
+            deleted += purge_expired_idempotency_records()
+    logger.info("idempotency_keys_purged", deleted=deleted)
+    return deleted
+
+
+@shared_task(name="app.tasks.refresh_claim_rollups")
+def refresh_claim_rollups(full=False):
+    from carsapi_app.analytics import refresh_claim_daily_rollups
+    from carsapi_app.sharding import enabled
+
+    if enabled():
+        # claim-urile sunt pe shard-uri, rollup-urile în `default`: nu există ce agrega
+        logger.info("claim_rollups_skipped_sharded")
+        return 0
+    return refresh_claim_daily_rollups(full=full)
+
+
+@shared_task(name="app.tasks.archive_old_records")
+def archive_old_records():
+    from carsapi_app.archive import archive_old_records as _archive
+    from carsapi_app.sharding import enabled, shard_aliases, use_shard
+
+    if not enabled():
+        return _archive()
+    results = {}
+    for alias in shard_aliases():
+        with use_shard(alias):
+            results[alias] = _archive()
+    return results
+
+
+@shared_task(name="app.tasks.purge_car", bind=True, max_retries=3, default_retry_delay=30)
+def purge_car(self, car_id):
+    from carsapi_app.archive import purge_car_data
+    from carsapi_app.sharding import shard_for_id, use_shard
+
     try:
-        created = detect_and_log_expired_policies()
-        logger.info("policy_expiry_scan_done", created=created, run_date=str(timezone.localdate()))
-        return created
+        with use_shard(shard_for_id(car_id)):
+            return purge_car_data(car_id)
     except Exception as exc:
-        logger.error("policy_expiry_scan_failed", error=str(exc))
-        raise
+        # purge-ul e reluabil; după retry-uri epuizate îl preia purge_deleted_cars
+        logger.error("car_purge_failed", car_id=car_id, error=str(exc), retries=self.request.retries)
+        raise self.retry(exc=exc)
+
+
+@shared_task(name="app.tasks.purge_owner", bind=True, max_retries=3, default_retry_delay=30)
+def purge_owner(self, owner_id):
+    from carsapi_app.archive import purge_owner_data
+    from carsapi_app.sharding import shard_for_owner, use_shard
+
+    try:
+        with use_shard(shard_for_owner(owner_id)):
+            return purge_owner_data(owner_id)
+    except Exception as exc:
+        logger.error("owner_purge_failed", owner_id=owner_id, error=str(exc), retries=self.request.retries)
+        raise self.retry(exc=exc)
+
+
+@shared_task(name="app.tasks.purge_deleted_cars")
+def purge_deleted_cars():
+    """Re-programează purge-urile de mașini și de owner-i rămase neterminate."""
+    from django.conf import settings
+    from carsapi_app.archive import pending_car_purges, pending_owner_purges
+    from carsapi_app.sharding import shard_aliases, use_shard
 
+    enqueued = 0
+    for alias in shard_aliases():
+        with use_shard(alias):
+            car_ids = pending_car_purges(settings.CAR_PURGE_SWEEP_LIMIT)
+        for car_id in car_ids:
+            purge_car.delay(car_id)
+        enqueued += len(car_ids)
+    owner_ids = pending_owner_purges(settings.CAR_PURGE_SWEEP_LIMIT)
+    for owner_id in owner_ids:
+        purge_owner.delay(owner_id)
+    enqueued += len(owner_ids)
+    logger.info("car_purges_requeued", enqueued=enqueued)
+    return enqueued
@@ -1,3 +1,1156 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+from contextlib import ExitStack
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from carsapi import celery_app
+from carsapi.profiles import current_process
+from . import openapi, query_plans, services, sharding, tasks, throttling, views
+from .management.commands.importtime import BOOT_CODE
+from .streaming import ResponseTooLarge, iter_json_array
+from .urls import router
+from .vin import normalize_vin, vin_cache
+from .analytics import refresh_claim_daily_rollups
+from .archive import archive_old_records, purge_car_data
+from .identity_map import remember, request_identity_map
+from .serializers import ClaimSerializer
+from .models import (
+    Owner, Car, Claim, ClaimDailyRollup, CollectionVersion, InsurancePolicy, ArchivedInsurancePolicy,
+    IdempotencyRecord, PolicyExpiryLog, ShardIdSequence,
+)
+
+# alias-urile vin din carsapi.settings_test; cu setările de producție testele multi-DB se sar
+SHARDS = getattr(settings, "TEST_SHARD_ALIASES", [])
+
+
+# throttling-ul are store in-memory per proces; testele nu vor să-l lovească
+@override_settings(RATE_LIMIT_BUDGETS={}, LOAD_SHED_SQL_LATENCY_MS=1e9)
+class ApiTestCase(TestCase):
+    def setUp(self):
+        # ShardPinMiddleware nu resetează pin-ul la ieșire (streaming); între teste da
+        self.addCleanup(sharding.pin_shard, None)
+        # cache-ul VIN -> id e per proces; id-urile din alte teste nu mai există (Postgres nu le refolosește)
+        vin_cache.clear()
+        self.client = APIClient()
+        self.owner = Owner.objects.create(owner_name="Ana")
+        self.car = Car.objects.create(vin="VIN1", make="Dacia", model="Logan", year_of_manufacture=2010, owner=self.owner)
+
+
+# ---------- IDEMPOTENCY ----------
+class IdempotencyKeyTests(ApiTestCase):
+    payload = {"claim_date": "2024-02-01", "description": "zgârietură", "amount": "120.50"}
+
+    def post_claim(self, payload, key="k-1"):
+        return self.client.post(
+            f"/api/cars/{self.car.id}/claims/", payload, format="json", HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_replay_returns_stored_response_without_writing(self):
+        with mock.patch("carsapi_app.actions.create_claim_for_car", wraps=services.create_claim_for_car) as create:
+            first = self.post_claim(self.payload)
+            second = self.post_claim(self.payload)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second["Location"], first["Location"])
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(Claim.objects.count(), 1)
+
+    def test_changed_payload_with_same_key_is_rejected(self):
+        self.assertEqual(self.post_claim(self.payload).status_code, 201)
+        resp = self.post_claim({**self.payload, "amount": "999.00"})
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(Claim.objects.count(), 1)
+
+    def test_failed_write_frees_the_key(self):
+        resp = self.post_claim({**self.payload, "description": "  "})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.post_claim(self.payload)
+        self.assertEqual(resp.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", resp)
+        self.assertEqual(Claim.objects.count(), 1)
+
+
+# ---------- ANALYTICS / ROLLUPS ----------
+class ClaimRollupTests(ApiTestCase):
+    url = "/api/claims/analytics/?period=year"
+
+    def add_claim(self, amount, claim_date=date(2024, 3, 1), car=None):
+        return Claim.objects.create(car=car or self.car, claim_date=claim_date, description="x", amount=Decimal(amount))
+
+    def totals(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        return data["source"], [(r["periodStart"], r["count"], r["sum"]) for r in data["results"]]
+
+    def test_empty_rollup_table_falls_back_to_raw(self):
+        self.add_claim("10.00")
+        self.assertFalse(ClaimDailyRollup.objects.exists())
+        self.assertEqual(self.totals(), ("raw", [("2024-01-01", 1, "10.00")]))
+
+    def test_full_rebuild_picks_up_edits_deletes_and_deleted_cars(self):
+        edited = self.add_claim("10.00")
+        dropped = self.add_claim("5.00")
+        other = Car.objects.create(vin="VIN2", make="Ford", model="Focus", owner=self.owner)
+        self.add_claim("7.00", car=other)
+        refresh_claim_daily_rollups()
+        self.assertEqual(self.totals(), ("rollup", [("2024-01-01", 3, "22.00")]))
+
+        Claim.objects.filter(pk=edited.pk).update(amount=Decimal("20.00"))
+        dropped.delete()
+        Car.objects.filter(pk=other.pk).update(deleted_at=timezone.now())
+        refresh_claim_daily_rollups(full=True)
+        self.assertEqual(self.totals(), ("rollup", [("2024-01-01", 1, "20.00")]))
+
+    def test_archived_claims_are_not_counted(self):
+        self.add_claim("10.00", claim_date=date(2010, 1, 5))
+        self.add_claim("3.00")
+        refresh_claim_daily_rollups()
+        archive_old_records()
+        refresh_claim_daily_rollups(full=True)
+        self.assertEqual(self.totals(), ("rollup", [("2024-01-01", 1, "3.00")]))
+        resp = self.client.get(self.url + "&source=raw")
+        self.assertEqual([r["count"] for r in resp.json()["results"]], [1])
+
+
+# ---------- PROFILE DE PROCES ----------
+class ProcessProfileTests(TestCase):
+    def test_profile_from_argv(self):
+        with mock.patch.dict(os.environ, {"CARSAPI_PROCESS": ""}):
+            self.assertEqual(current_process(["/usr/bin/celery", "-A", "carsapi", "worker"]), "worker")
+            self.assertEqual(current_process(["/usr/bin/celery", "-A", "carsapi", "beat"]), "beat")
+            self.assertEqual(current_process(["manage.py", "runserver"]), "web")
+            self.assertEqual(current_process(["manage.py", "migrate"]), "cli")
+            self.assertEqual(current_process(["gunicorn"]), "web")
+        with mock.patch.dict(os.environ, {"CARSAPI_PROCESS": "beat"}):
+            self.assertEqual(current_process(["manage.py", "runserver"]), "beat")
+
+    def test_celery_app_is_current_app(self):
+        # shared_task-urile (purge_car.delay din web) trebuie să folosească broker-ul din settings
+        from celery import current_app
+
+        self.assertIs(current_app._get_current_object(), celery_app)
+        self.assertIs(tasks.purge_car.app, celery_app)
+
+    def test_worker_boot_does_not_load_views_or_urlconf(self):
+        env = {**os.environ, "CARSAPI_PROCESS": "worker"}
+        env.pop("CELERY_SKIP_CHECKS", None)
+        check = (
+            "; import sys; print(','.join(m for m in ('carsapi.urls', 'carsapi_app.views', "
+            "'rest_framework.generics', 'rest_framework.views', 'drf_spectacular', 'django_filters') "
+            "if m in sys.modules))"
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", BOOT_CODE["worker"] + check], env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip(), "")
+
+
+# ---------- SCHEMA OPENAPI ----------
+@override_settings(OPENAPI_RUNTIME_FALLBACK=False)
+class OpenApiSchemaTests(TestCase):
+    body = b'{"openapi": "3.0.3"}'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(OPENAPI_SCHEMA_DIR=tmp.name))
+        self.addCleanup(openapi._artifacts.clear)
+        self.client = APIClient()
+
+    def build(self):
+        with mock.patch.object(openapi, "generate_schema_json", return_value=self.body):
+            openapi.build_schema_artifact()
+
+    def test_missing_artifact_is_not_cached(self):
+        self.assertEqual(self.client.get("/api/schema/").status_code, 503)
+        self.build()
+        resp = self.client.get("/api/schema/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, self.body)
+
+    def test_if_none_match_compares_whole_etags(self):
+        self.build()
+        etag = self.client.get("/api/schema/")["ETag"]
+        strong = etag[2:]
+        for header, expected in [
+            (f'"other", {etag}', 304),
+            (strong, 304),
+            ("*", 304),
+            (f'"x{strong[1:]}', 200),
+            (f'W/"{strong[1:-1]}-gzip"', 200),
+            (f"x{etag}", 200),
+        ]:
+            with self.subTest(header=header):
+                resp = self.client.get("/api/schema/", HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(resp.status_code, expected)
+
+    def test_code_version_covers_only_schema_sources(self):
+        version = openapi.code_version.__wrapped__
+        with tempfile.TemporaryDirectory() as base:
+            base = Path(base)
+            for name in openapi._SCHEMA_SOURCES:
+                (base / name).parent.mkdir(parents=True, exist_ok=True)
+                (base / name).write_text(name)
+            with override_settings(BASE_DIR=base):
+                before = version()
+                (base / "carsapi_app/tests.py").write_text("x")
+                (base / "carsapi_app/migrations").mkdir()
+                (base / "carsapi_app/migrations/0099_x.py").write_text("x")
+                self.assertEqual(version(), before)
+                (base / "carsapi_app/serializers.py").write_text("changed")
+                self.assertNotEqual(version(), before)
+
+
+# ---------- ETAG / VERSIUNI ----------
+class CollectionVersionTests(ApiTestCase):
+    def version(self, name="policy"):
+        return CollectionVersion.objects.get(name=name).version
+
+    def test_rows_exist_from_migration(self):
+        self.assertEqual(set(CollectionVersion.objects.values_list("name", flat=True)), {"claim", "policy"})
+
+    def test_update_bumps_version_after_commit(self):
+        policy = services.create_policy_for_car(self.car, provider="A", start_date=date(2024, 1, 1), end_date=date(2024, 12, 31))
+        before = self.version()
+        etag = self.client.get("/api/policies/")["ETag"]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.patch(f"/api/policies/{policy.id}/", {"provider": "B"}, format="json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(self.version(), before)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+
+        self.assertEqual(self.version(), before + 1)
+        resp = self.client.get("/api/policies/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def add_claims(self, *days):
+        return [
+            Claim.objects.create(car=self.car, claim_date=d, description="x", amount=Decimal("10.00")) for d in days
+        ]
+
+    def assertInvalidates(self, url, change, bumps=1):
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            change()
+        self.assertEqual(len(callbacks), bumps)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_queryset_update_invalidates(self):
+        self.add_claims(date(2024, 1, 1), date(2024, 1, 2))
+        self.assertInvalidates(
+            "/api/claims/", lambda: Claim.objects.filter(car=self.car).update(amount=Decimal("99.00")),
+        )
+
+    def test_bulk_update_invalidates(self):
+        policies = [
+            services.create_policy_for_car(self.car, provider="A", start_date=date(2024, m, 1), end_date=date(2024, m, 2))
+            for m in (1, 2)
+        ]
+        for p in policies:
+            p.provider = "B"
+        self.assertInvalidates("/api/policies/", lambda: InsurancePolicy.objects.bulk_update(policies, ["provider"]))
+
+    def test_delete_of_older_rows_invalidates_with_one_bump(self):
+        # max(id) nu se schimbă: doar versiunea prinde ștergerea
+        old = self.add_claims(date(2024, 1, 1), date(2024, 1, 2))
+        self.add_claims(date(2024, 1, 3))
+        self.assertInvalidates("/api/claims/", lambda: Claim.objects.filter(pk__in=[c.pk for c in old]).delete())
+
+    def test_archive_invalidates(self):
+        self.add_claims(date(2010, 1, 1), date(2010, 1, 2), date(2024, 1, 1))
+        self.assertInvalidates("/api/claims/", archive_old_records)
+
+    def test_etag_does_not_count_rows(self):
+        etag = self.client.get("/api/claims/?car=%d" % self.car.pk)["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/claims/?car=%d" % self.car.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT(" in q["sql"].upper()])
+
+
+# ---------- THROTTLING / LOAD SHEDDING ----------
+class TokenBucketTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(RATE_LIMIT_BUDGETS={"default": {"rate": "1/s", "burst": 2}}))
+        self.enterContext(mock.patch.object(throttling, "_store", throttling.LocalTokenBucketStore()))
+
+    def test_bucket_refills_at_rate_up_to_burst(self):
+        store = throttling.LocalTokenBucketStore()
+        with mock.patch("carsapi_app.throttling.time.monotonic") as clock:
+            clock.return_value = 100.0
+            self.assertEqual([store.take("k", 1.0, 2.0)[0] for _ in range(3)], [True, True, False])
+            clock.return_value = 100.5
+            self.assertFalse(store.take("k", 1.0, 2.0)[0])
+            clock.return_value = 101.0
+            self.assertTrue(store.take("k", 1.0, 2.0)[0])
+            clock.return_value = 200.0
+            self.assertEqual(store.take("k", 1.0, 2.0), (True, 1.0))
+
+    def test_exhausted_bucket_returns_429_with_retry_after(self):
+        url = f"/api/cars/{self.car.id}/"
+        codes = [self.client.get(url).status_code for _ in range(2)]
+        limited = self.client.get(url)
+        self.assertEqual(codes, [200, 200])
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(limited["Retry-After"], "1")
+
+    def test_clients_behind_the_proxy_get_their_own_buckets(self):
+        url = f"/api/cars/{self.car.id}/"
+        with override_settings(RATE_LIMIT_CLIENT_IP_HEADER="X-Forwarded-For"):
+            first = [self.client.get(url, HTTP_X_FORWARDED_FOR="1.1.1.1").status_code for _ in range(3)]
+            other = self.client.get(url, HTTP_X_FORWARDED_FOR="2.2.2.2")
+            # intrarea din stânga vine de la client; contează cea adăugată de proxy
+            spoofed = self.client.get(url, HTTP_X_FORWARDED_FOR="9.9.9.9, 1.1.1.1")
+        self.assertEqual(first, [200, 200, 429])
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(spoofed.status_code, 429)
+
+    def test_authenticated_users_are_keyed_by_user(self):
+        from django.contrib.auth.models import AnonymousUser, User
+        from django.test import RequestFactory
+
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR="1.1.1.1", REMOTE_ADDR="10.0.0.1")
+        request.user = AnonymousUser()
+        self.assertEqual(throttling.client_ident(request), "ip:10.0.0.1")
+        with override_settings(RATE_LIMIT_CLIENT_IP_HEADER="X-Forwarded-For"):
+            self.assertEqual(throttling.client_ident(request), "ip:1.1.1.1")
+            request.user = User.objects.create(username="ana")
+            self.assertEqual(throttling.client_ident(request), f"user:{request.user.pk}")
+
+    def test_store_down_fails_open(self):
+        # port închis: conexiunea la Redis eșuează imediat
+        store = throttling.RedisTokenBucketStore("redis://127.0.0.1:1/0")
+        with mock.patch.object(throttling, "_store", store):
+            codes = [self.client.get(f"/api/cars/{self.car.id}/").status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 200])
+
+
+class LoadSheddingTests(ApiTestCase):
+    databases = {"default", *SHARDS}
+
+    def setUp(self):
+        super().setUp()
+        self.monitor = throttling.SqlLatencyMonitor()
+        self.enterContext(mock.patch.object(throttling, "sql_latency", self.monitor))
+        self.enterContext(mock.patch("carsapi_app.middleware.sql_latency.sql_latency", self.monitor))
+        self.enterContext(override_settings(LOAD_SHED_SQL_LATENCY_MS=100))
+
+    def test_sheds_low_priority_reads_only(self):
+        self.monitor.record(1000)
+        shed = self.client.get("/api/cars/")
+        search = self.client.get(f"/api/cars/{self.car.id}/?search=x")
+        detail = self.client.get(f"/api/cars/{self.car.id}/")
+        write = self.client.post(
+            "/api/cars/", {"vin": "VIN2", "make": "Dacia", "owner_id": self.owner.id}, format="json",
+        )
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed["Retry-After"], str(settings.LOAD_SHED_RETRY_AFTER))
+        self.assertEqual(search.status_code, 503)
+        self.assertEqual([detail.status_code, write.status_code], [200, 201])
+
+    def test_recovers_when_samples_age_out(self):
+        self.monitor.record(1000)
+        self.assertEqual(self.client.get("/api/cars/").status_code, 503)
+        self.monitor.updated_at -= settings.LOAD_SHED_WINDOW_SECONDS + 1
+        self.assertEqual(self.client.get("/api/cars/").status_code, 200)
+
+    @skipUnless(SHARDS, "shard aliases missing from DATABASES")
+    def test_shard_queries_feed_the_latency_average(self):
+        from django.db import connections
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .middleware.sql_latency import SqlLatencyMiddleware
+
+        def view(request):
+            with connections[SHARDS[0]].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return HttpResponse()
+
+        SqlLatencyMiddleware(view)(RequestFactory().get("/"))
+        self.assertIsNotNone(self.monitor.ewma_ms)
+
+
+class ByVinThrottleScopeTests(ApiTestCase):
+    def test_by_vin_routes_share_the_id_route_budget(self):
+        budgets = {"default": {"rate": "100/s", "burst": 100}, "car.insurance_valid": {"rate": "1/m", "burst": 2}}
+        with override_settings(RATE_LIMIT_BUDGETS=budgets), \
+                mock.patch.object(throttling, "_store", throttling.LocalTokenBucketStore()):
+            by_id = self.client.get(f"/api/cars/{self.car.id}/insurance-valid/?date=2024-01-01")
+            by_vin = self.client.get("/api/cars/by-vin/VIN1/insurance-valid/?date=2024-01-01")
+            limited = self.client.get("/api/cars/by-vin/VIN1/insurance-valid/?date=2024-01-01")
+            other = self.client.get("/api/cars/by-vin/VIN1/")
+
+        self.assertEqual([by_id.status_code, by_vin.status_code], [200, 200])
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(other.status_code, 200)
+
+
+# ---------- SPARSE FIELDSETS ----------
+class SparseFieldsetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.policies = [
+            services.create_policy_for_car(self.car, provider="A", start_date=date(2024, m, 1), end_date=date(2024, m, 2))
+            for m in (1, 2)
+        ]
+        other = Car.objects.create(vin="VIN2", make="Ford", model="Focus", owner=self.owner)
+        services.create_policy_for_car(other, provider="B", start_date=date(2024, 1, 1), end_date=date(2024, 1, 2))
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/cars/?ordering=vin&" + query)
+        self.assertEqual(resp.status_code, 200)
+        car_selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "carsapi_app_car"."id"')]
+        return resp.json()["results"], car_selects, len(ctx.captured_queries)
+
+    def test_empty_fields_means_all_fields(self):
+        full, _, _ = self.get("")
+        empty, _, _ = self.get("fields=")
+        self.assertEqual(empty, full)
+        self.assertEqual(set(empty[0]), {"id", "vin", "make", "model", "year_of_manufacture", "owner"})
+
+    def test_only_selects_requested_columns(self):
+        rows, (select,), _ = self.get("fields=id,vin")
+        self.assertEqual(rows[0], {"id": self.car.id, "vin": "VIN1"})
+        self.assertNotIn('"carsapi_app_car"."make"', select)
+        self.assertNotIn("JOIN", select)
+
+    def test_collapsed_relations_are_ids(self):
+        rows, _, queries = self.get("fields=vin,owner,policies")
+        rows[0]["policies"].sort()
+        self.assertEqual(rows[0], {"vin": "VIN1", "owner": self.owner.id, "policies": [p.id for p in self.policies]})
+        self.assertEqual(len(rows[1]["policies"]), 1)
+        # count + mașini + un singur prefetch pentru toate listele de id-uri
+        self.assertEqual(queries, 3)
+
+    def test_expanded_relations_are_nested_and_prefetched(self):
+        rows, (select,), queries = self.get("fields=vin&expand=owner,policies")
+        self.assertEqual(rows[0]["owner"]["owner_name"], "Ana")
+        self.assertEqual([p["provider"] for p in rows[0]["policies"]], ["A", "A"])
+        self.assertIn("JOIN", select)
+        self.assertEqual(queries, 3)
+
+    def test_writes_ignore_fields(self):
+        resp = self.client.patch(f"/api/cars/{self.car.id}/?fields=id", {"make": "Renault"}, format="json")
+        self.assertEqual(resp.json()["make"], "Renault")
+
+
+# ---------- VIN ----------
+normalize_vins_migration = importlib.import_module("carsapi_app.migrations.0010_normalize_vins")
+
+
+class VinNormalizationTests(ApiTestCase):
+    def migrate(self):
+        from django.apps import apps
+
+        normalize_vins_migration.normalize_vins(apps, mock.Mock(connection=connection))
+
+    def test_normalize_vin(self):
+        self.assertEqual(normalize_vin(" vf1-abc 123 "), "VF1ABC123")
+        self.assertEqual(normalize_vin("A" * 17), "A" * 17)
+        for raw in ("", "-", "A" * 18, "VF1_ABC", "VÎN", None, 123):
+            with self.subTest(raw=raw):
+                self.assertIsNone(normalize_vin(raw))
+
+    def test_writes_store_normalized_vin_and_check_uniqueness_on_it(self):
+        resp = self.client.post("/api/cars/", {"vin": "vf1-abc 1", "owner_id": self.owner.id}, format="json")
+        self.assertEqual(resp.json()["vin"], "VF1ABC1")
+        dup = self.client.post("/api/cars/", {"vin": "Vf1 Abc-1", "owner_id": self.owner.id}, format="json")
+        self.assertEqual(dup.status_code, 400)
+        self.assertIn("vin", dup.json())
+        bad = self.client.post("/api/cars/", {"vin": "VF1_ABC", "owner_id": self.owner.id}, format="json")
+        self.assertEqual(bad.status_code, 400)
+
+    def test_migration_normalizes_stored_vins(self):
+        legacy = Car.objects.create(vin="abc-123", owner=self.owner)
+        odd = Car.objects.create(vin="AB_12", owner=self.owner)
+        self.assertEqual(self.client.get("/api/cars/by-vin/abc-123/").status_code, 404)
+
+        self.migrate()
+
+        legacy.refresh_from_db()
+        odd.refresh_from_db()
+        self.assertEqual((legacy.vin, odd.vin), ("ABC123", "AB_12"))
+        self.assertEqual(self.client.get("/api/cars/by-vin/abc-123/").json()["id"], legacy.id)
+        resp = self.client.post("/api/cars/", {"vin": "abc-123", "owner_id": self.owner.id}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_migration_fails_on_collisions_without_changes(self):
+        Car.objects.create(vin="abc-123", owner=self.owner)
+        Car.objects.create(vin="ABC123", owner=self.owner)
+        Car.objects.create(vin="x-1", owner=self.owner)
+        Car.objects.create(vin="X 1", owner=self.owner)
+        with self.assertRaisesMessage(RuntimeError, "ABC123: car ids"):
+            self.migrate()
+        self.assertEqual(
+            sorted(Car.objects.values_list("vin", flat=True)), ["ABC123", "VIN1", "X 1", "abc-123", "x-1"],
+        )
+
+    def test_resolve_vins_batch(self):
+        other = Car.objects.create(vin="VF1ABC", owner=self.owner)
+        resp = self.client.post(
+            "/api/cars/resolve-vins/", {"vins": ["vin1", "vf1-abc", "VF1 ABC", "NOPE1", "bad_vin", 7]}, format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {
+            "results": {"vin1": self.car.id, "vf1-abc": other.id, "VF1 ABC": other.id},
+            "notFound": ["NOPE1"],
+            "invalid": ["bad_vin", 7],
+        })
+
+    def test_resolve_vins_validates_the_payload(self):
+        self.assertEqual(self.client.post("/api/cars/resolve-vins/", {"vins": "VIN1"}, format="json").status_code, 400)
+        with mock.patch.object(views, "MAX_BATCH_VINS", 2):
+            resp = self.client.post("/api/cars/resolve-vins/", {"vins": ["A", "B", "C"]}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_cache_follows_vin_changes(self):
+        self.assertEqual(self.client.get("/api/cars/by-vin/VIN1/").status_code, 200)
+        self.client.patch(f"/api/cars/{self.car.id}/", {"vin": "VIN9"}, format="json")
+        self.assertEqual(self.client.get("/api/cars/by-vin/VIN1/").status_code, 404)
+        self.assertEqual(self.client.get("/api/cars/by-vin/vin9/").json()["id"], self.car.id)
+
+
+# ---------- STREAMING ----------
+class StreamingTests(ApiTestCase):
+    def seed_claims(self, count, start=0):
+        base = date(2000, 1, 1)
+        Claim.objects.bulk_create(
+            [Claim(car=self.car, claim_date=base + timedelta(days=i % 9000), description="d" * 80,
+                   amount=Decimal("0.10")) for i in range(start, start + count)],
+            batch_size=5000,
+        )
+
+    def drain_peak(self, url):
+        """(peak bytes alocați cât timp se consumă stream-ul, bytes trimiși)."""
+        resp = self.client.get(url)
+        self.assertTrue(resp.streaming)
+        tracemalloc.start()
+        try:
+            sent = sum(len(chunk) for chunk in resp.streaming_content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, sent
+
+    def test_history_memory_stays_flat_as_claims_grow(self):
+        url = f"/api/cars/{self.car.id}/history/"
+        self.seed_claims(5_000)
+        small_peak, small_sent = self.drain_peak(url)
+        self.seed_claims(15_000, start=5_000)
+        large_peak, large_sent = self.drain_peak(url)
+
+        self.assertGreater(large_sent, 3 * small_sent)
+        # 4x mai multe rânduri, dar memoria e dată de chunk-uri (cursor + buffer), nu de total
+        self.assertLess(large_peak, small_peak * 1.5)
+        self.assertLess(large_peak, large_sent / 2)
+
+    def test_stream_json_array_memory_is_independent_of_row_count(self):
+        def peak(rows):
+            tracemalloc.start()
+            try:
+                for _ in iter_json_array(({"i": i, "amount": Decimal("1.00")} for i in range(rows)), 10**9):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(peak(200_000), peak(20_000) * 1.5)
+
+    def test_response_over_limit_aborts_the_stream(self):
+        self.seed_claims(2_000)
+        with override_settings(STREAMING_MAX_RESPONSE_BYTES=100_000):
+            resp = self.client.get(f"/api/cars/{self.car.id}/history/")
+            with self.assertRaises(ResponseTooLarge):
+                list(resp.streaming_content)
+
+    def test_small_response_over_limit_fails_instead_of_truncating(self):
+        with self.assertRaises(ResponseTooLarge):
+            list(iter_json_array([{"a": "x" * 100}], max_bytes=50))
+
+    def test_amount_is_an_exact_decimal_string(self):
+        Claim.objects.create(car=self.car, claim_date=date(2024, 1, 1), description="x", amount=Decimal("0.10"))
+        Claim.objects.create(car=self.car, claim_date=date(2024, 1, 2), description="y",
+                             amount=Decimal("1234567890.12"))
+        # claims nested se stream-uiesc doar fără paginare
+        with mock.patch.object(views.CarViewSet, "pagination_class", None):
+            responses = [self.client.get(f"/api/cars/{self.car.id}/{path}/") for path in ("history", "claims")]
+        for resp in responses:
+            body = b"".join(resp.streaming_content)
+            self.assertIn(b'"amount":"0.10"', body)
+            self.assertIn(b'"amount":"1234567890.12"', body)
+            self.assertEqual(sorted(r["amount"] for r in json.loads(body)), ["0.10", "1234567890.12"])
+        self.assertEqual(b"".join(iter_json_array([{"amount": Decimal("2.50")}], 100)), b'[{"amount":"2.50"}]')
+
+    def test_history_schema_matches_streamed_rows(self):
+        services.create_policy_for_car(self.car, provider="A", start_date=date(2024, 1, 1), end_date=date(2024, 12, 31))
+        Claim.objects.create(car=self.car, claim_date=date(2024, 1, 2), description="y", amount=Decimal("0.10"))
+        rows = json.loads(b"".join(self.client.get(f"/api/cars/{self.car.id}/history/").streaming_content))
+
+        schema = json.loads(openapi.generate_schema_json())
+        for path in ("/api/cars/{id}/history/", "/api/cars/by-vin/{vin}/history/"):
+            body = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+            self.assertEqual(body, {"type": "array", "items": {"$ref": "#/components/schemas/HistoryEntry"}})
+        components = schema["components"]["schemas"]
+        mapping = components["HistoryEntry"]["discriminator"]["mapping"]
+        for row in rows:
+            entry = components[mapping[row["type"]].rsplit("/", 1)[-1]]
+            self.assertEqual(set(entry["properties"]), set(row))
+        amount = components["HistoryClaimEntry"]["properties"]["amount"]
+        self.assertEqual((amount["type"], amount["format"]), ("string", "decimal"))
+
+    def test_sharded_list_shape_is_documented(self):
+        # un singur artefact pentru ambele moduri: `count` opțional, `cursor` documentat
+        schema = json.loads(openapi.generate_schema_json())
+        for path, component in (("/api/cars/", "PaginatedCarList"), ("/api/claims/", "PaginatedClaimList")):
+            params = {p["name"] for p in schema["paths"][path]["get"]["parameters"]}
+            self.assertTrue({"page", "cursor"} <= params, params)
+            page = schema["components"]["schemas"][component]
+            self.assertEqual(page["required"], ["results"])
+            self.assertIn("OWNER_SHARDS", page["properties"]["count"]["description"])
+        owners = schema["components"]["schemas"]["PaginatedOwnerList"]
+        self.assertIn("count", owners["required"])
+
+
+# ---------- ARHIVARE / ȘTERGERE ASINCRONĂ ----------
+class CarPurgeTests(ApiTestCase):
+    def delete_car(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.delete(f"/api/cars/{self.car.id}/")
+
+    def test_delete_survives_broker_outage_and_sweep_requeues_it(self):
+        Claim.objects.create(car=self.car, claim_date=date(2024, 1, 1), description="x", amount=Decimal("1.00"))
+        with mock.patch("carsapi_app.tasks.purge_car") as task:
+            task.delay.side_effect = OSError("broker down")
+            resp = self.delete_car()
+        self.assertEqual(resp.status_code, 202)
+        task.delay.assert_called_once_with(self.car.id)
+        self.assertEqual(self.client.get(f"/api/cars/{self.car.id}/").status_code, 404)
+
+        # încă în perioada de grație: sweep-ul nu se atinge de ea
+        with mock.patch("carsapi_app.tasks.purge_car") as task:
+            self.assertEqual(tasks.purge_deleted_cars(), 0)
+        task.delay.assert_not_called()
+
+        Car.objects.filter(pk=self.car.pk).update(deleted_at=timezone.now() - timedelta(hours=2))
+        real = tasks.purge_car
+        with mock.patch("carsapi_app.tasks.purge_car") as task:
+            task.delay.side_effect = lambda car_id: real.apply(args=[car_id])
+            self.assertEqual(tasks.purge_deleted_cars(), 1)
+        self.assertFalse(Car.objects.filter(pk=self.car.pk).exists())
+        self.assertFalse(Claim.objects.exists())
+
+    def test_purge_retries_on_error(self):
+        Car.objects.filter(pk=self.car.pk).update(deleted_at=timezone.now())
+        failures = [OSError("db gone"), OSError("db gone")]
+
+        def flaky(car_id):
+            if failures:
+                raise failures.pop()
+            return purge_car_data(car_id)
+
+        with mock.patch("carsapi_app.archive.purge_car_data", side_effect=flaky) as purge:
+            result = tasks.purge_car.apply(args=[self.car.id])
+        self.assertTrue(result.successful())
+        self.assertEqual(purge.call_count, 3)
+        self.assertFalse(Car.objects.filter(pk=self.car.pk).exists())
+
+    def test_purge_gives_up_after_max_retries(self):
+        with mock.patch("carsapi_app.archive.purge_car_data", side_effect=OSError("db gone")) as purge:
+            result = tasks.purge_car.apply(args=[self.car.id])
+        self.assertTrue(result.failed())
+        self.assertEqual(purge.call_count, tasks.purge_car.max_retries + 1)
+
+
+class SoftDeleteVisibilityTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.policy = InsurancePolicy.objects.create(
+            car=self.car, provider="X", start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+        )
+        self.claim = Claim.objects.create(car=self.car, claim_date=date(2024, 1, 1), description="x", amount=Decimal("1.00"))
+
+    def delete(self, url):
+        with mock.patch("carsapi_app.tasks.purge_car"), mock.patch("carsapi_app.tasks.purge_owner"):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.delete(url)
+        self.assertEqual(resp.status_code, 202)
+
+    def assertHidden(self):
+        self.assertEqual(self.client.get("/api/policies/").json()["results"], [])
+        self.assertEqual(self.client.get("/api/claims/").json()["results"], [])
+        self.assertEqual(self.client.get(f"/api/policies/{self.policy.id}/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/claims/{self.claim.id}/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/cars/{self.car.id}/claims/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/cars/by-vin/{self.car.vin}/").status_code, 404)
+        resp = self.client.post("/api/claims/", {
+            "car": self.car.id, "claim_date": "2024-02-01", "description": "y", "amount": "2.00",
+        }, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("car", resp.json())
+        resp = self.client.post("/api/policies/", {
+            "car": self.car.id, "start_date": "2025-01-01", "end_date": "2025-12-31",
+        }, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("car", resp.json())
+
+    def test_car_delete_hides_its_policies_and_claims(self):
+        etag = self.client.get("/api/policies/")["ETag"]
+        self.delete(f"/api/cars/{self.car.id}/")
+        self.assertHidden()
+        self.assertNotEqual(self.client.get("/api/policies/")["ETag"], etag)
+        self.assertEqual(self.client.post("/api/cars/resolve-vins/", {"vins": [self.car.vin]}, format="json").json()["notFound"], [self.car.vin])
+
+    def test_owner_delete_is_soft_and_hides_everything_below_it(self):
+        other = Owner.objects.create(owner_name="Bob")
+        self.delete(f"/api/owners/{self.owner.id}/")
+        self.assertTrue(Owner.objects.filter(pk=self.owner.pk).exists())
+        self.assertTrue(Claim.objects.filter(pk=self.claim.pk).exists())
+        self.assertEqual([o["id"] for o in self.client.get("/api/owners/").json()["results"]], [other.id])
+        self.assertEqual(self.client.get(f"/api/cars/{self.car.id}/").status_code, 404)
+        self.assertHidden()
+        resp = self.client.post("/api/cars/", {"vin": "VIN2", "owner_id": self.owner.id}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("owner_id", resp.json())
+
+    def test_identity_map_hit_on_a_deleted_car_is_rejected(self):
+        Car.objects.filter(pk=self.car.pk).update(deleted_at=timezone.now())
+        self.car.refresh_from_db()
+        data = {"car": self.car.id, "claim_date": "2024-02-01", "description": "y", "amount": "2.00"}
+        with request_identity_map():
+            remember(self.car)
+            ser = ClaimSerializer(data=data)
+            self.assertFalse(ser.is_valid())
+        self.assertIn("car", ser.errors)
+
+
+class OwnerPurgeTests(ApiTestCase):
+    def test_purge_owner_removes_cars_dependents_and_owner(self):
+        InsurancePolicy.objects.create(car=self.car, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31))
+        Claim.objects.create(car=self.car, claim_date=date(2024, 1, 1), description="x", amount=Decimal("1.00"))
+        with mock.patch("carsapi_app.tasks.purge_owner") as task:
+            task.delay.side_effect = OSError("broker down")
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.delete(f"/api/owners/{self.owner.id}/")
+        self.assertEqual(resp.status_code, 202)
+        task.delay.assert_called_once_with(self.owner.id)
+
+        # enqueue pierdut -> îl preia sweep-ul după perioada de grație
+        Owner.objects.filter(pk=self.owner.pk).update(deleted_at=timezone.now() - timedelta(hours=2))
+        Car.objects.filter(pk=self.car.pk).update(deleted_at=timezone.now())
+        real = tasks.purge_owner
+        with mock.patch("carsapi_app.tasks.purge_owner") as task:
+            task.delay.side_effect = lambda owner_id: real.apply(args=[owner_id])
+            self.assertEqual(tasks.purge_deleted_cars(), 1)
+        self.assertFalse(Owner.objects.filter(pk=self.owner.pk).exists())
+        self.assertFalse(Car.objects.exists())
+        self.assertFalse(InsurancePolicy.objects.exists())
+        self.assertFalse(Claim.objects.exists())
+
+    def test_purge_marks_cars_left_live_by_a_crash(self):
+        Owner.objects.filter(pk=self.owner.pk).update(deleted_at=timezone.now())
+        result = tasks.purge_owner.apply(args=[self.owner.id])
+        self.assertTrue(result.successful())
+        self.assertEqual(result.result, {"cars": 1, "owner": 1})
+        self.assertFalse(Car.objects.filter(pk=self.car.pk).exists())
+
+    def test_live_owner_is_not_purged(self):
+        self.assertEqual(tasks.purge_owner.apply(args=[self.owner.id]).result, {"cars": 0, "owner": 0})
+        self.assertTrue(Car.objects.filter(pk=self.car.pk).exists())
+
+
+class ArchivedPolicyOverlapTests(ApiTestCase):
+    def test_new_policy_may_not_overlap_an_archived_one(self):
+        ArchivedInsurancePolicy.objects.create(
+            original_id=999, car_id=self.car.id, provider="A", start_date=date(2010, 1, 1), end_date=date(2010, 12, 31),
+        )
+        url = f"/api/cars/{self.car.id}/policies/"
+        resp = self.client.post(url, {"provider": "B", "start_date": "2010-06-01", "end_date": "2011-05-31"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(url, {"provider": "B", "start_date": "2011-01-01", "end_date": "2011-12-31"}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(InsurancePolicy.objects.count(), 1)
+
+
+# ---------- QUERY PLANS ----------
+class QueryPlanCheckTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        fd, self.baseline = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        os.unlink(self.baseline)
+        self.addCleanup(lambda: os.path.exists(self.baseline) and os.unlink(self.baseline))
+
+    def check(self, *args):
+        call_command("check_query_plans", "--basename", "policy", "--baseline", self.baseline, *args,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_fk_filter_uses_a_real_pk_or_is_skipped(self):
+        registry = [r for r in router.registry if r[2] == "policy"]
+        Car.objects.all().delete()
+        self.assertEqual([c for c in query_plans.enumerate_cases(registry) if "car" in c.params], [])
+
+        car = Car.objects.create(vin="VIN9", owner=self.owner)
+        cases = [c for c in query_plans.enumerate_cases(registry) if "car" in c.params]
+        self.assertTrue(cases)
+        self.assertEqual({c.params["car"] for c in cases}, {str(car.pk)})
+        self.assertEqual(cases[0].label, "policy?car=<pk>")
+
+    def test_fails_only_on_differences_from_the_baseline(self):
+        with self.assertRaises(CommandError):
+            self.check()
+        self.check("--write-baseline")
+        self.check()
+
+        with open(self.baseline, encoding="utf-8") as fh:
+            data = json.load(fh)
+        data[connection.vendor].pop(sorted(data[connection.vendor])[0])
+        with open(self.baseline, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        with self.assertRaisesMessage(CommandError, "1 query plan(s) regressed"):
+            self.check()
+
+    def test_seed_is_refused_on_remote_databases(self):
+        remote = mock.Mock(vendor="postgresql", settings_dict={"NAME": "cars", "HOST": "db.prod.internal"})
+        local = mock.Mock(vendor="postgresql", settings_dict={"NAME": "cars", "HOST": "localhost"})
+        test_db = mock.Mock(vendor="postgresql", settings_dict={"NAME": "test_cars", "HOST": "db.prod.internal"})
+        with mock.patch.object(query_plans, "connections", {"remote": remote, "local": local, "test": test_db}):
+            self.assertFalse(query_plans.seed_allowed("remote"))
+            self.assertTrue(query_plans.seed_allowed("remote", ["db.prod.internal"]))
+            self.assertTrue(query_plans.seed_allowed("local"))
+            self.assertFalse(query_plans.seed_allowed("test"))
+
+    def test_committed_baseline_does_not_accept_the_car_list_headline_query(self):
+        # search pe owner + -year_of_manufacture: pagina trebuie servită de index pe orice vendor
+        for vendor in ("postgresql", "sqlite"):
+            baseline = query_plans.load_baseline(settings.QUERY_PLAN_BASELINE, vendor)
+            self.assertIsNotNone(baseline, vendor)
+            self.assertNotIn("car?ordering=-year_of_manufacture&search=a:page", baseline, vendor)
+            self.assertNotIn("car:page", baseline, vendor)
+
+
+# ---------- IDENTITY MAP / NUMĂR DE QUERY-URI ----------
+class WriteQueryCountTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.policy = InsurancePolicy.objects.create(car=self.car, provider="A", start_date=date(2023, 1, 1),
+                                                     end_date=date(2023, 12, 31))
+        self.claim = Claim.objects.create(car=self.car, claim_date=date(2023, 5, 1), description="x",
+                                          amount=Decimal("10.00"))
+
+    def selects(self, client, method, url, data, status):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = getattr(client, method)(url, data, format="json")
+        self.assertEqual(resp.status_code, status, resp.content)
+        return Counter(q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT"))
+
+    def assertWrite(self, queries, method, url, data, status=200):
+        """
+        Numărul total de query-uri, plus aceeași scriere fără identity map (rulată întâi și
+        anulată): exact un SELECT în plus, rândul mașinii sau al owner-ului citit a doua oară.
+        """
+        without_map = [m for m in settings.MIDDLEWARE if not m.endswith(".IdentityMapMiddleware")]
+        # client nou: handler-ul clientului își păstrează lanțul de middleware
+        with override_settings(MIDDLEWARE=without_map), transaction.atomic():
+            unmapped = self.selects(APIClient(), method, url, data, status)
+            transaction.set_rollback(True)
+        vin_cache.clear()
+
+        with self.assertNumQueries(queries):
+            mapped = self.selects(self.client, method, url, data, status)
+        extra = list((unmapped - mapped).elements())
+        self.assertEqual(len(extra), 1, extra)
+        self.assertEqual(mapped - unmapped, Counter())
+        self.assertRegex(extra[0], r'^SELECT "carsapi_app_(car|owner)"\."id", ')
+        car_selects = [sql for sql in mapped.elements() if sql.startswith('SELECT "carsapi_app_car"."id", "carsapi_app_car"."vin"')]
+        self.assertLessEqual(len(car_selects), 1, car_selects)
+
+    # nested: car + (SAVEPOINT, overlap, INSERT, RELEASE); by-VIN adaugă rezolvarea VIN -> id
+    def test_nested_policy_post(self):
+        payload = {"provider": "B", "start_date": "2024-01-01", "end_date": "2024-06-30"}
+        self.assertWrite(5, "post", f"/api/cars/{self.car.id}/policies/", payload, status=201)
+        payload = {"provider": "B", "start_date": "2024-07-01", "end_date": "2024-12-31"}
+        self.assertWrite(6, "post", "/api/cars/by-vin/VIN1/policies/", payload, status=201)
+
+    def test_nested_claim_post(self):
+        payload = {"claim_date": "2024-02-01", "description": "x", "amount": "10.00"}
+        self.assertWrite(4, "post", f"/api/cars/{self.car.id}/claims/", payload, status=201)
+        self.assertWrite(5, "post", "/api/cars/by-vin/VIN1/claims/", payload, status=201)
+
+    # PUT cu vin verifică unicitatea (un query în plus)
+    def test_car_put_and_patch(self):
+        payload = {"vin": "VIN1", "make": "Dacia", "model": "Sandero", "owner_id": self.owner.id}
+        self.assertWrite(3, "put", f"/api/cars/{self.car.id}/", payload)
+        self.assertWrite(2, "patch", f"/api/cars/{self.car.id}/", {"owner_id": self.owner.id})
+
+    # car vine din select_related al obiectului; bump-ul de versiune rulează după commit
+    def test_policy_put_and_patch(self):
+        url = f"/api/policies/{self.policy.id}/"
+        payload = {"car": self.car.id, "provider": "C", "start_date": "2023-01-01", "end_date": "2023-12-31"}
+        self.assertWrite(3, "put", url, payload)
+        self.assertWrite(3, "patch", url, {"car": self.car.id, "provider": "B"})
+
+    def test_claim_put_and_patch(self):
+        url = f"/api/claims/{self.claim.id}/"
+        payload = {"car": self.car.id, "claim_date": "2023-05-01", "description": "y", "amount": "11.00"}
+        self.assertWrite(2, "put", url, payload)
+        self.assertWrite(2, "patch", url, {"car": self.car.id, "claim_date": "2023-05-02", "description": "z"})
+
+
+# ---------- SHARDING PE OWNER ----------
+
+
+@skipUnless(set(SHARDS) <= set(settings.DATABASES), "shard aliases missing from DATABASES")
+@override_settings(
+    OWNER_SHARDS=SHARDS, DATABASE_ROUTERS=["carsapi_app.sharding.OwnerShardRouter"],
+    REST_FRAMEWORK={**settings.REST_FRAMEWORK, "PAGE_SIZE": 2},
+)
+class ShardedModeTests(ApiTestCase):
+    databases = {"default", *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # la ready() semnalele se conectează doar cu OWNER_SHARDS setat
+        with override_settings(OWNER_SHARDS=SHARDS):
+            sharding.connect_signals()
+            # ce face `setup_shards` în producție (bazele de test au secvențe simple)
+            for alias in SHARDS:
+                if connections[alias].vendor == "postgresql":
+                    sharding.align_sequences(alias)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.disconnect(sender=Owner, dispatch_uid="owner-shard-replica-save")
+        post_delete.disconnect(sender=Owner, dispatch_uid="owner-shard-replica-delete")
+        for model in sharding.INTERLEAVED_MODELS:
+            pre_save.disconnect(sender=model, dispatch_uid=f"shard-id-{model._meta.model_name}")
+        super().tearDownClass()
+
+    def setUp(self):
+        self.addCleanup(sharding.pin_shard, None)
+        self.client = APIClient()
+        # câte un owner pe fiecare shard (owner.id % 3 == indexul shard-ului)
+        self.owners = {}
+        while len(self.owners) < len(SHARDS):
+            owner = Owner.objects.create(owner_name=f"o{Owner.objects.count()}")
+            self.owners.setdefault(sharding.shard_for_owner(owner.pk), owner)
+
+    def create_car(self, vin, owner, **extra):
+        resp = self.client.post("/api/cars/", {"vin": vin, "owner_id": owner.pk, **extra}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        return resp.json()["id"]
+
+    def where(self, model, pk):
+        return [alias for alias in SHARDS if model.objects.using(alias).filter(pk=pk).exists()]
+
+    def test_writes_route_to_the_owner_shard_with_interleaved_ids(self):
+        for index, alias in enumerate(SHARDS):
+            owner = self.owners[alias]
+            car_id = self.create_car(f"VIN{index}", owner, make="Dacia")
+            policy = self.client.post(f"/api/cars/{car_id}/policies/",
+                                      {"provider": "A", "start_date": "2024-01-01", "end_date": "2024-12-31"},
+                                      format="json").json()
+            claim = self.client.post(f"/api/cars/{car_id}/claims/",
+                                     {"claim_date": "2024-02-01", "description": "x", "amount": "10.00"},
+                                     format="json").json()
+            for model, pk in ((Car, car_id), (InsurancePolicy, policy["id"]), (Claim, claim["id"])):
+                self.assertEqual(self.where(model, pk), [alias])
+                self.assertEqual(pk % len(SHARDS), index)
+            self.assertFalse(Car.objects.using("default").filter(pk=car_id).exists())
+
+            self.assertEqual(self.client.get(f"/api/cars/{car_id}/").json()["vin"], f"VIN{index}")
+            self.assertEqual(self.client.get(f"/api/claims/{claim['id']}/").status_code, 200)
+            self.assertEqual(self.client.get(f"/api/cars/by-vin/VIN{index}/").json()["id"], car_id)
+
+        # VIN unic pe toate shard-urile, nu doar pe cel curent
+        resp = self.client.post("/api/cars/", {"vin": "VIN0", "owner_id": self.owners[SHARDS[1]].pk}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_id_allocator_continues_after_existing_rows(self):
+        alias = SHARDS[1]
+        if connections[alias].vendor == "postgresql":
+            self.skipTest("Postgres uses sequences (align_sequences)")
+        Car.objects.using(alias).create(pk=301, vin="VINOLD", owner_id=self.owners[alias].pk)
+        self.assertEqual(sharding.allocate_interleaved_id(Car, alias), 304)
+        self.assertEqual(sharding.allocate_interleaved_id(Car, alias), 307)
+        # contorul e sursa de adevăr, nu max(id): un id alocat și ne-folosit nu se refolosește
+        self.assertEqual(ShardIdSequence.objects.using(alias).get(table=Car._meta.db_table).last_id, 307)
+        self.assertEqual(self.create_car("VINNEW", self.owners[alias]), 310)
+
+    def test_top_level_lists_are_keyset_pages_without_count(self):
+        for i in range(3):
+            self.create_car(f"VINL{i}", self.owners[SHARDS[i]])
+        data = self.client.get("/api/cars/").json()
+        self.assertEqual(set(data), {"next", "previous", "results"})
+        self.assertIn("cursor=", data["next"])
+        self.assertIsNone(data["previous"])
+
+    def test_owner_is_replicated_to_its_shard_and_delete_cascades_there(self):
+        owner = self.owners[SHARDS[1]]
+        replica = Owner.objects.using(SHARDS[1]).get(pk=owner.pk)
+        self.assertEqual(replica.owner_name, owner.owner_name)
+        self.assertFalse(Owner.objects.using(SHARDS[0]).filter(pk=owner.pk).exists())
+
+        owner.owner_name = "Ion"
+        owner.save()
+        self.assertEqual(Owner.objects.using(SHARDS[1]).get(pk=owner.pk).owner_name, "Ion")
+
+        car_id = self.create_car("VINX", owner)
+        owner.delete()
+        self.assertFalse(Owner.objects.using(SHARDS[1]).filter(pk=owner.pk).exists())
+        self.assertEqual(self.where(Car, car_id), [])
+
+    def test_owner_delete_soft_deletes_and_purges_on_its_shard(self):
+        owner = self.owners[SHARDS[2]]
+        car_id = self.create_car("VINX", owner)
+        self.client.post(f"/api/cars/{car_id}/claims/",
+                         {"claim_date": "2024-02-01", "description": "x", "amount": "10.00"}, format="json")
+        with mock.patch("carsapi_app.tasks.purge_owner") as task:
+            with self.captureOnCommitCallbacks(execute=True, using="default"):
+                self.assertEqual(self.client.delete(f"/api/owners/{owner.pk}/").status_code, 202)
+        task.delay.assert_called_once_with(owner.pk)
+        self.assertIsNotNone(Car.objects.using(SHARDS[2]).get(pk=car_id).deleted_at)
+        self.assertEqual(self.client.get("/api/claims/").json()["results"], [])
+
+        self.assertEqual(tasks.purge_owner.apply(args=[owner.pk]).result, {"cars": 1, "owner": 1})
+        self.assertFalse(Owner.objects.filter(pk=owner.pk).exists())
+        self.assertFalse(Owner.objects.using(SHARDS[2]).filter(pk=owner.pk).exists())
+        self.assertEqual(self.where(Car, car_id), [])
+        self.assertFalse(Claim.objects.using(SHARDS[2]).exists())
+
+    def walk(self, url, expected):
+        """Toate paginile listei (cursor keyset), în ordine; un cursor care nu avansează = eșec, nu buclă."""
+        rows = []
+        for _ in range(expected + 2):
+            if not url:
+                return rows
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200, resp.content)
+            data = resp.json()
+            rows += data["results"]
+            url = data["next"]
+        self.fail(f"cursor pagination did not finish after {expected + 2} pages")
+
+    @staticmethod
+    def sortable(value):
+        # JSON dă string-uri: datetime/decimal se compară după valoare, nu lexicografic
+        if not isinstance(value, str):
+            return value
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            return value
+
+    def assertOrdered(self, rows, field, desc):
+        values = [self.sortable(r[field]) for r in rows]
+        present = [v for v in values if v is not None]
+        self.assertEqual(present, sorted(present, reverse=desc), field)
+        self.assertEqual(values, present + [None] * (len(values) - len(present)), "NULLs last")
+
+    def test_cursor_walks_every_ordering_without_duplicates_or_gaps(self):
+        base = timezone.now().replace(microsecond=0)
+        car_ids = []
+        for i in range(7):
+            owner = self.owners[SHARDS[i % len(SHARDS)]]
+            car_ids.append(self.create_car(
+                f"VINC{i}", owner, make=["Dacia", "Ford"][i % 2], model=f"M{i % 3}",
+                year_of_manufacture=None if i == 3 else 2000 + i % 4,
+            ))
+        claim_ids, policy_ids = [], []
+        for i, car_id in enumerate(car_ids * 2):
+            claim = self.client.post(f"/api/cars/{car_id}/claims/",
+                                     {"claim_date": f"2024-01-0{1 + i % 3}", "description": "x",
+                                      "amount": f"{10 + i % 4}.00"}, format="json").json()
+            # created_at distincte doar la nivel de microsecundă (aceeași milisecundă)
+            Claim.objects.using(sharding.shard_for_id(claim["id"])).filter(pk=claim["id"]).update(
+                created_at=base + timedelta(microseconds=i * 7 % 11))
+            claim_ids.append(claim["id"])
+        for i, car_id in enumerate(car_ids):
+            policy = self.client.post(f"/api/cars/{car_id}/policies/",
+                                      {"provider": "ABC"[i % 3], "start_date": f"202{i % 3}-01-01",
+                                       "end_date": f"202{i % 3}-0{1 + i % 2}-28"}, format="json").json()
+            policy_ids.append(policy["id"])
+
+        for prefix, viewset, ids in (("cars", views.CarViewSet, car_ids), ("policies", views.InsurancePolicyViewSet, policy_ids),
+                                      ("claims", views.ClaimViewSet, claim_ids)):
+            for field in viewset.ordering_fields:
+                for desc in (False, True):
+                    with self.subTest(resource=prefix, ordering=field, desc=desc):
+                        rows = self.walk(f"/api/{prefix}/?ordering={'-' if desc else ''}{field}", len(ids))
+                        self.assertEqual(sorted(r["id"] for r in rows), sorted(ids))
+                        self.assertOrdered(rows, field, desc)
+
+    def test_sparse_fieldset_list_does_not_refetch_ordering_columns(self):
+        for i in range(4):
+            self.create_car(f"VINF{i}", self.owners[SHARDS[i % len(SHARDS)]], make="Dacia")
+        with ExitStack() as stack:
+            for alias in SHARDS:
+                stack.enter_context(self.assertNumQueries(1, using=alias))
+            resp = self.client.get("/api/cars/?fields=id,vin&ordering=make")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([set(r) for r in resp.json()["results"]], [{"id", "vin"}] * 2)
+
+    def test_policy_expiry_scan_runs_on_every_shard(self):
+        today = timezone.localdate()
+        for index, alias in enumerate(SHARDS):
+            car_id = self.create_car(f"VINE{index}", self.owners[alias])
+            self.client.post(f"/api/cars/{car_id}/policies/",
+                             {"provider": "A", "start_date": str(today - timedelta(days=30)), "end_date": str(today)},
+                             format="json")
+        midnight = timezone.localtime().replace(hour=0, minute=5)
+        with mock.patch("carsapi_app.tasks.timezone.localtime", return_value=midnight):
+            self.assertEqual(tasks.policy_expiry_scan(), len(SHARDS))
+            self.assertEqual(tasks.policy_expiry_scan(), 0)
+        for alias in SHARDS:
+            self.assertEqual(PolicyExpiryLog.objects.using(alias).count(), 1)
+
+    def test_idempotency_record_lives_on_the_car_shard(self):
+        alias = SHARDS[2]
+        car_id = self.create_car("VINI", self.owners[alias])
+        payload = {"claim_date": "2024-02-01", "description": "x", "amount": "10.00"}
+        for _ in range(2):
+            resp = self.client.post(f"/api/cars/{car_id}/claims/", payload, format="json", HTTP_IDEMPOTENCY_KEY="k")
+            self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp["Idempotent-Replayed"], "true")
+        self.assertEqual(IdempotencyRecord.objects.using(alias).count(), 1)
+        self.assertFalse(IdempotencyRecord.objects.using("default").exists())
+        self.assertEqual(Claim.objects.using(alias).count(), 1)
+
+    def test_claim_analytics_is_not_available(self):
+        self.assertEqual(self.client.get("/api/claims/analytics/").status_code, 501)
+        self.assertEqual(tasks.refresh_claim_rollups(full=True), 0)
@@ -0,0 +1,229 @@
+# app/throttling.py
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+import structlog
+
+logger = structlog.get_logger()
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_budget(budget: Dict) -> Tuple[float, float]:
+    """{"rate": "10/s", "burst": 20} -> (tokens pe secundă, capacitate)."""
+    num, period = budget["rate"].split("/")
+    rate = int(num) / _PERIODS[period[0]]
+    return rate, float(budget.get("burst", max(int(num), 1)))
+
+
+# ---------- STORES ----------
+class LocalTokenBucketStore:
+    """Stand-in in-memory (per proces) pentru dev/teste; nu e partajat între workeri."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+
+# refill + take atomic în Redis; timpul vine de la server (fără skew între workeri)
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBucketStore:
+    """Token bucket partajat între toți workerii (un hash Redis per client+endpoint)."""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, tokens = self._take(keys=[key], args=[rate, burst])
+        return bool(int(allowed)), float(tokens)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = settings.RATE_LIMIT_REDIS_URL
+                _store = RedisTokenBucketStore(url) if url else LocalTokenBucketStore()
+    return _store
+
+
+_VIN_SUFFIX = "_by_vin"
+
+
+def _canonical_action(action: str) -> str:
+    """Variantele by-VIN folosesc bugetul (și bucket-ul) variantei după id."""
+    if action == "by_vin":
+        return "retrieve"
+    if action.endswith(_VIN_SUFFIX):
+        return action[: -len(_VIN_SUFFIX)]
+    return action
+
+
+def endpoint_scope(view) -> str:
+    basename = getattr(view, "basename", None)
+    action = getattr(view, "action", None)
+    if basename and action:
+        action = _canonical_action(action)
+        return f"{basename}.{action}"
+    return view.__class__.__name__
+
+
+def client_ident(request) -> str:
+    """
+    Cheia clientului pentru bucket: userul autentificat; altfel IP-ul din header-ul
+    setat de proxy-ul nostru (RATE_LIMIT_CLIENT_IP_HEADER), luat la RATE_LIMIT_TRUSTED_PROXIES
+    poziții de la dreapta (intrările din stânga le poate trimite clientul); altfel REMOTE_ADDR.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    header = settings.RATE_LIMIT_CLIENT_IP_HEADER
+    if header:
+        addrs = [a.strip() for a in request.headers.get(header, "").split(",") if a.strip()]
+        if addrs:
+            return f"ip:{addrs[-min(settings.RATE_LIMIT_TRUSTED_PROXIES, len(addrs))]}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+# ---------- RATE LIMIT ----------
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Buget per client (client_ident) și endpoint (RATE_LIMIT_BUDGETS, cheie
+    `<basename>.<action>`, fallback `default`); rutele by-VIN împart bugetul cu
+    varianta după id. Dacă Redis nu răspunde, cererea trece (fail-open).
+    """
+
+    def allow_request(self, request, view):
+        budgets = settings.RATE_LIMIT_BUDGETS
+        scope = endpoint_scope(view)
+        budget = budgets.get(scope) or budgets.get("default")
+        if not budget:
+            return True
+
+        rate, burst = parse_budget(budget)
+        key = f"tb:{client_ident(request)}:{scope}"
+        try:
+            allowed, tokens = get_bucket_store().take(key, rate, burst)
+        except Exception as exc:
+            logger.warning("rate_limit_store_unavailable", error=str(exc))
+            return True
+
+        self._wait = None if allowed else (1 - tokens) / rate
+        if not allowed:
+            logger.info("rate_limited", request_id=getattr(request, "id", None), scope=scope, key=key)
+        return allowed
+
+    def wait(self):
+        return getattr(self, "_wait", None)
+
+
+# ---------- LOAD SHEDDING ----------
+class SqlLatencyMonitor:
+    """EWMA a latenței SQL în procesul curent (alimentat de SqlLatencyMiddleware)."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.ewma_ms: Optional[float] = None
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, duration_ms: float) -> None:
+        with self._lock:
+            if self.ewma_ms is None:
+                self.ewma_ms = duration_ms
+            else:
+                self.ewma_ms += self.alpha * (duration_ms - self.ewma_ms)
+            self.updated_at = time.monotonic()
+
+    def current_ms(self, max_age: float) -> float:
+        # fără eșantioane recente (ex. tot traficul a fost respins) -> considerăm sănătos
+        if self.ewma_ms is None or time.monotonic() - self.updated_at > max_age:
+            return 0.0
+        return self.ewma_ms
+
+
+sql_latency = SqlLatencyMonitor()
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Service temporarily overloaded, retry later."
+    default_code = "overloaded"
+
+    def __init__(self, wait: int):
+        super().__init__()
+        self.wait = wait
+
+
+def is_low_priority(request, view) -> bool:
+    """Doar citiri de tip listă/căutare/raport; scrierile și insurance-valid rămân active."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if getattr(view, "action", None) in settings.LOAD_SHED_LOW_PRIORITY_ACTIONS:
+        return True
+    return bool(request.query_params.get(api_settings.SEARCH_PARAM, ""))
+
+
+class LoadSheddingThrottle(BaseThrottle):
+    """503 + Retry-After pentru trafic low-priority cât timp latența SQL e peste prag."""
+
+    def allow_request(self, request, view):
+        if not is_low_priority(request, view):
+            return True
+        latency = sql_latency.current_ms(max_age=settings.LOAD_SHED_WINDOW_SECONDS)
+        if latency > settings.LOAD_SHED_SQL_LATENCY_MS:
+            logger.warning(
+                "load_shed", request_id=getattr(request, "id", None),
+                scope=endpoint_scope(view), sql_latency_ms=round(latency, 1),
+            )
+            raise ServiceOverloaded(wait=settings.LOAD_SHED_RETRY_AFTER)
+        return True
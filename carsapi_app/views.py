@@ -1,29 +1,79 @@
 # app/views.py
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.utils import timezone
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, throttle_classes
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
 from .models import Owner, Car, InsurancePolicy, Claim, PolicyExpiryLog
+from drf_spectacular.utils import PolymorphicProxySerializer, extend_schema
+
 from .serializers import (
     OwnerSerializer, CarSerializer,
     InsurancePolicySerializer, ClaimSerializer, PolicyExpiryLogSerializer,
+    HistoryPolicyEntrySerializer, HistoryClaimEntrySerializer,
 )
-from . import actions
+from . import actions, services
+from .openapi import code_version, load_schema_artifact
+from .middleware.compression import preferred_encoding
+from .conditional import ConditionalListMixin, is_not_modified
+from .fieldsets import SparseFieldsetViewMixin
+from .identity_map import IdentityMapViewMixin, remember
+from .pagination import ShardAwarePagination
+from .sharding import ShardRoutingMixin, enabled as sharding_enabled, pin_shard, shard_for_id
+from .vin import MAX_BATCH_VINS, normalize_vin, resolve_vin, resolve_vins, vin_cache
 import structlog
 logger = structlog.get_logger()
 
 
 # ------------ HEALTH ------------
 @api_view(["GET"])
+@throttle_classes([])
 def health_check(_request):
     logger.info("health_check", now=timezone.now().isoformat())
     return Response({"status": "ok", "time": timezone.now().isoformat()})
 
 
+# ------------ OPENAPI SCHEMA (precompilat) ------------
+@require_GET
+def openapi_schema(request):
+    """Schema generată la build (manage.py build_openapi), servită cu ETag + precomprimare."""
+    artifact = load_schema_artifact(code_version())
+    if artifact is None:
+        if settings.OPENAPI_RUNTIME_FALLBACK:
+            from drf_spectacular.views import SpectacularAPIView
+
+            logger.warning("openapi_schema_runtime_fallback", version=code_version())
+            return SpectacularAPIView.as_view()(request)
+        logger.error("openapi_schema_artifact_missing", version=code_version())
+        return JsonResponse(
+            {"detail": "OpenAPI schema artifact missing. Run `manage.py build_openapi`."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+    etag = f'W/"{artifact.etag}"'
+    if is_not_modified(request, etag):
+        resp = HttpResponseNotModified()
+    else:
+        encoding = preferred_encoding(request, artifact.bodies) or "identity"
+        resp = HttpResponse(artifact.bodies[encoding], content_type="application/vnd.oai.openapi+json")
+        if encoding != "identity":
+            resp["Content-Encoding"] = encoding
+    resp["ETag"] = etag
+    resp["Vary"] = "Accept-Encoding"
+    resp["Cache-Control"] = f"public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}"
+    resp["X-Schema-Version"] = artifact.version
+    return resp
+
+
 # ------------ OWNER ------------
 class OwnerViewSet(viewsets.ModelViewSet):
-    queryset = Owner.objects.all()
+    # ca la mașini: owner-ii în curs de ștergere nu mai sunt vizibili
+    queryset = Owner.objects.filter(deleted_at__isnull=True)
     serializer_class = OwnerSerializer
 
     filterset_fields = ["owner_email"]
@@ -31,11 +81,28 @@ class OwnerViewSet(viewsets.ModelViewSet):
     ordering_fields = ["owner_name", "owner_email"]
     ordering = ["owner_name"]
 
+    def destroy(self, request, *args, **kwargs):
+        # același drum ca la mașini: soft delete + purge asincron, fără cascade sincron
+        owner = self.get_object()
+        services.schedule_owner_deletion(owner)
+        return Response({"detail": "Owner deletion scheduled."}, status=status.HTTP_202_ACCEPTED)
+
 
 # ------------ CAR ------------
-class CarViewSet(viewsets.ModelViewSet):
-    queryset = Car.objects.select_related("owner").all()
+# history e un array JSON stream-uit (nepaginat), nu CarSerializer: polițe și claim-uri, după `type`
+HISTORY_RESPONSE = PolymorphicProxySerializer(
+    component_name="HistoryEntry",
+    serializers={"POLICY": HistoryPolicyEntrySerializer, "CLAIM": HistoryClaimEntrySerializer},
+    resource_type_field_name="type",
+    many=True,
+)
+
+
+class CarViewSet(ShardRoutingMixin, IdentityMapViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    # mașinile șterse (soft delete, purge în curs) nu mai sunt vizibile
+    queryset = Car.objects.select_related("owner").filter(deleted_at__isnull=True)
     serializer_class = CarSerializer
+    pagination_class = ShardAwarePagination
 
     filterset_fields = {
         "owner": ["exact"],
@@ -47,6 +114,60 @@ class CarViewSet(viewsets.ModelViewSet):
     search_fields = ["vin", "make", "model", "owner__owner_name"]
     ordering_fields = ["year_of_manufacture", "make", "model", "vin"]
     ordering = ["-year_of_manufacture", "make", "model"]
+    identity_map_related = ("owner",)
+    shard_key_field = "owner_id"
+
+    def destroy(self, request, *args, **kwargs):
+        # fără cascade sincron: soft delete + purge asincron în batch-uri
+        car = self.get_object()
+        services.schedule_car_deletion(car)
+        return Response({"detail": "Car deletion scheduled."}, status=status.HTTP_202_ACCEPTED)
+
+    def get_object(self):
+        vin = self.kwargs.get("vin")
+        if vin is None:
+            return super().get_object()
+
+        normalized = normalize_vin(vin)
+        if normalized is None:
+            raise ValidationError({"vin": "Invalid VIN (1-17 letters/digits)."})
+        car_id = resolve_vin(normalized)
+        if car_id is None:
+            raise NotFound()
+        if sharding_enabled():
+            pin_shard(shard_for_id(car_id))
+
+        queryset = self.filter_queryset(self.get_queryset())
+        car = queryset.filter(pk=car_id, vin=normalized).first()
+        if car is None:
+            # cache stale (VIN schimbat în alt proces) -> lookup direct pe indexul unic
+            vin_cache.evict_id(car_id)
+            car = get_object_or_404(queryset, vin=normalized)
+        self.check_object_permissions(self.request, car)
+        remember(car, *self.identity_map_related)
+        return car
+
+    # --- BY VIN (detaliu + batch) ---
+    @action(detail=False, methods=["get"], url_path=r"by-vin/(?P<vin>[^/.]+)")
+    def by_vin(self, request, vin=None):
+        return self.retrieve(request)
+
+    @action(detail=False, methods=["post"], url_path="resolve-vins")
+    def resolve_vin_batch(self, request):
+        raw = request.data.get("vins")
+        if not isinstance(raw, list):
+            raise ValidationError({"vins": "Expected a list of VINs."})
+        if len(raw) > MAX_BATCH_VINS:
+            raise ValidationError({"vins": f"At most {MAX_BATCH_VINS} VINs per request."})
+
+        normalized = {v: normalize_vin(v) for v in raw if isinstance(v, str)}
+        invalid = [v for v in raw if not isinstance(v, str) or normalized.get(v) is None]
+        found = resolve_vins(n for n in normalized.values() if n)
+        results = {v: found[n] for v, n in normalized.items() if n in found}
+        not_found = [v for v, n in normalized.items() if n and n not in found]
+        logger.info("vins_resolved", request_id=getattr(request, "id", None),
+                    requested=len(raw), found=len(results), invalid=len(invalid))
+        return Response({"results": results, "notFound": not_found, "invalid": invalid})
 
     # --- POLICIES (nested) ---
     @action(detail=True, methods=["get", "post"], url_path="policies")
@@ -61,10 +182,11 @@ class CarViewSet(viewsets.ModelViewSet):
         return actions.get_or_create_claims_action(self, request, car)
 
     # --- HISTORY ---
-    @action(detail=True, methods=["get"], url_path="history")
+    @extend_schema(responses=HISTORY_RESPONSE)
+    @action(detail=True, methods=["get"], url_path="history", pagination_class=None)
     def history(self, request, pk=None):
         car = self.get_object()
-        return actions.history_action(car)
+        return actions.history_action(car, request)
 
     # --- INSURANCE VALID ---
     @action(detail=True, methods=["get"], url_path="insurance-valid")
@@ -72,27 +194,60 @@ class CarViewSet(viewsets.ModelViewSet):
         car = self.get_object()
         return actions.insurance_valid_action(car, request)
 
+    # --- NESTED BY VIN (aceleași acțiuni, mașina găsită după VIN) ---
+    @action(detail=False, methods=["get", "post"], url_path=r"by-vin/(?P<vin>[^/.]+)/policies")
+    def policies_by_vin(self, request, vin=None):
+        return self.policies(request)
+
+    @action(detail=False, methods=["get", "post"], url_path=r"by-vin/(?P<vin>[^/.]+)/claims")
+    def claims_by_vin(self, request, vin=None):
+        return self.claims(request)
+
+    @extend_schema(responses=HISTORY_RESPONSE)
+    @action(detail=False, methods=["get"], url_path=r"by-vin/(?P<vin>[^/.]+)/history", pagination_class=None)
+    def history_by_vin(self, request, vin=None):
+        return self.history(request)
+
+    @action(detail=False, methods=["get"], url_path=r"by-vin/(?P<vin>[^/.]+)/insurance-valid")
+    def insurance_valid_by_vin(self, request, vin=None):
+        return self.insurance_valid(request)
+
 
 # ------------ POLICY ------------
-class InsurancePolicyViewSet(viewsets.ModelViewSet):
-    queryset = InsurancePolicy.objects.select_related("car").all()
+class InsurancePolicyViewSet(ShardRoutingMixin, ConditionalListMixin, IdentityMapViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    # polițele mașinilor șterse soft dispar odată cu mașina (join-ul pe car există deja)
+    queryset = InsurancePolicy.objects.select_related("car").filter(car__deleted_at__isnull=True)
     serializer_class = InsurancePolicySerializer
+    pagination_class = ShardAwarePagination
+    collection_version_names = ("policy",)
+    identity_map_related = ("car",)
+    shard_key_field = "car"
     filterset_fields = ["car", "provider", "start_date", "end_date"]
     ordering_fields = ["start_date", "end_date", "provider"]
     ordering = ["-end_date"]
 
 
 # ------------ CLAIM ------------
-class ClaimViewSet(viewsets.ModelViewSet):
-    queryset = Claim.objects.select_related("car").all()
+class ClaimViewSet(ShardRoutingMixin, ConditionalListMixin, IdentityMapViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = Claim.objects.select_related("car").filter(car__deleted_at__isnull=True)
     serializer_class = ClaimSerializer
+    pagination_class = ShardAwarePagination
+    collection_version_names = ("claim",)
+    identity_map_related = ("car",)
+    shard_key_field = "car"
     filterset_fields = ["car", "claim_date"]
     ordering_fields = ["claim_date", "amount", "created_at"]
     ordering = ["-claim_date"]
 
+    # --- ANALYTICS (agregări SQL) ---
+    @action(detail=False, methods=["get"], url_path="analytics")
+    def analytics(self, request):
+        return actions.claim_analytics_action(request)
+
 
 # ------------ EXPIRY LOG (read-only) ------------
-class PolicyExpiryLogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = PolicyExpiryLog.objects.select_related("policy").all()
+class PolicyExpiryLogViewSet(ShardRoutingMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = PolicyExpiryLog.objects.select_related("policy").filter(policy__car__deleted_at__isnull=True)
     serializer_class = PolicyExpiryLogSerializer
+    pagination_class = ShardAwarePagination
     ordering = ["-logged_expiry_at"]
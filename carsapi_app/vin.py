@@ -0,0 +1,104 @@
+# app/vin.py
+from __future__ import annotations
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .models import Car
+from .sharding import shard_aliases, scatter_first
+
+# VIN-urile moderne au 17 caractere, cele dinainte de 1981 pot fi mai scurte
+VIN_RE = re.compile(r"^[A-Z0-9]{1,17}$")
+_SEPARATORS = re.compile(r"[\s-]+")
+MAX_BATCH_VINS = 10_000
+
+
+def normalize_vin(raw) -> Optional[str]:
+    """Uppercase, fără spații/cratime; None dacă nu e un VIN valid."""
+    if not isinstance(raw, str):
+        return None
+    vin = _SEPARATORS.sub("", raw).upper()
+    return vin if VIN_RE.match(vin) else None
+
+
+class VinCache:
+    """LRU mic VIN -> car id, per proces; invalidat la save/delete pe Car."""
+
+    def __init__(self, maxsize: int):
+        self._data: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+
+    def get(self, vin: str) -> Optional[int]:
+        with self._lock:
+            car_id = self._data.get(vin)
+            if car_id is not None:
+                self._data.move_to_end(vin)
+            return car_id
+
+    def set(self, vin: str, car_id: int) -> None:
+        with self._lock:
+            self._data[vin] = car_id
+            self._data.move_to_end(vin)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict_id(self, car_id: int) -> None:
+        with self._lock:
+            for vin in [v for v, i in self._data.items() if i == car_id]:
+                del self._data[vin]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+vin_cache = VinCache(maxsize=getattr(settings, "VIN_CACHE_SIZE", 4096))
+
+
+def resolve_vin(vin: str) -> Optional[int]:
+    """VIN normalizat -> car id (cache, apoi indexul unic pe vin)."""
+    car_id = vin_cache.get(vin)
+    if car_id is not None:
+        return car_id
+    # VIN-ul e unic global; în mod sharded nu știm shard-ul dinainte
+    car_id = scatter_first(
+        lambda alias: Car.objects.using(alias).filter(vin=vin, deleted_at__isnull=True).values_list("id", flat=True).first()
+    )
+    if car_id is not None:
+        vin_cache.set(vin, car_id)
+    return car_id
+
+
+def resolve_vins(vins: Iterable[str]) -> Dict[str, int]:
+    """Batch: VIN-uri normalizate -> car id, un query per shard pentru cele necache-uite."""
+    found: Dict[str, int] = {}
+    missing = []
+    for vin in dict.fromkeys(vins):
+        car_id = vin_cache.get(vin)
+        if car_id is None:
+            missing.append(vin)
+        else:
+            found[vin] = car_id
+    for alias in shard_aliases():
+        if not missing:
+            break
+        for vin, car_id in Car.objects.using(alias).filter(vin__in=missing, deleted_at__isnull=True).values_list("vin", "id"):
+            vin_cache.set(vin, car_id)
+            found[vin] = car_id
+        missing = [v for v in missing if v not in found]
+    return found
+
+
+def _on_car_changed(sender, instance, **kwargs):
+    # VIN schimbat / mașină ștearsă -> intrarea veche nu mai e validă
+    vin_cache.evict_id(instance.pk)
+
+
+def connect_signals() -> None:
+    post_save.connect(_on_car_changed, sender=Car, dispatch_uid="vin-cache-save")
+    post_delete.connect(_on_car_changed, sender=Car, dispatch_uid="vin-cache-delete")